@@ -1,8 +1,7 @@
 import os
 import re  # Import the regular expression module
 import click
-from audio import processing
-from audio import fingerprinting
+from audio.pipeline import default_pipeline
 from database.database_manager import DatabaseManager
 from database.models import Song
 from sqlalchemy import func
@@ -37,6 +36,45 @@ def extract_artist_title(filename):
         return None, None
 
 
+def fingerprint_file(db_manager, file_path, song_id, pipeline=None):
+    """Fingerprints an audio file and stores the fingerprints for song_id.
+
+    Args:
+        db_manager (DatabaseManager): The database manager to store into.
+        file_path (str): Path to the audio file.
+        song_id (int): The ID of the song the file belongs to.
+        pipeline (FingerprintPipeline, optional): The pipeline to run. Defaults
+            to the calling thread's default_pipeline().
+
+    Returns:
+        int: The number of fingerprints stored, or None if the file could not be
+            processed or not all of its fingerprints could be stored.
+    """
+    pipeline = pipeline or default_pipeline()
+
+    # Load the audio
+    audio = pipeline.load(file_path)
+    if audio is None:
+        logger.error(f"Failed to load audio for {file_path}")
+        return None
+
+    # Create spectrogram, extract peaks and fingerprint them
+    fingerprints = pipeline.fingerprint_audio(audio, song_id)
+    if fingerprints is None:
+        logger.error(f"Failed to create spectrogram for {file_path}")
+        return None
+
+    # Store the fingerprints
+    stored = db_manager.store_fingerprints(fingerprints)
+    if stored != len(fingerprints):
+        logger.error(
+            f"Stored only {stored} of {len(fingerprints)} fingerprints for song ID {song_id}"
+        )
+        return None
+    logger.info(f"Fingerprinted {len(fingerprints)} for song ID {song_id}")
+    return len(fingerprints)
+
+
 @click.command()
 @click.option(
     "--songs-dir", default="songs", help="Path to the directory containing the songs."
@@ -89,30 +127,11 @@ def add_and_fingerprint_songs(songs_dir):
                 )
 
                 # Fingerprint the song
-                # Load the audio
-                audio, sr = processing.load_audio(file_path)
-                if audio is None:
-                    logger.error(f"Failed to load audio for {file_path}")
-                    click.echo(f"Failed to load audio for {file_path}")
-                    continue
-
-                # Create spectrogram
-                spectrogram = processing.create_spectrogram(audio)
-                if spectrogram is None:
-                    logger.error(f"Failed to create spectrogram for {file_path}")
-                    click.echo(f"Failed to create spectrogram for {file_path}")
+                num_fingerprints = fingerprint_file(db_manager, file_path, song_id)
+                if num_fingerprints is None:
+                    click.echo(f"Failed to fingerprint {file_path}")
                     continue
-
-                # Extract peaks
-                peaks = processing.extract_peaks(spectrogram)
-
-                # Create fingerprints
-                fingerprints = fingerprinting.create_fingerprint(peaks, song_id)
-
-                # Store the fingerprints
-                db_manager.store_fingerprints(fingerprints)
-                logger.info(f"Fingerprinted {len(fingerprints)} for song ID {song_id}")
-                click.echo(f"Fingerprinted {len(fingerprints)} for song ID {song_id}")
+                click.echo(f"Fingerprinted {num_fingerprints} for song ID {song_id}")
 
             else:
                 logger.error(
@@ -1,18 +1,101 @@
-from fastapi import FastAPI, UploadFile, HTTPException, status
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, HTTPException, Response, status
 from fastapi.responses import JSONResponse
 import io  # ADDED
-import random
+import threading
+import time
 
-from audio import processing
-from audio import fingerprinting
 from database.database_manager import DatabaseManager
 from api import schemas
-from matching import matcher
+from matching import recognizer
 from utils.logger import logger
+from utils import metrics
+from utils import profiling
 from config import config
 
-app = FastAPI()
-db_manager = DatabaseManager()
+# Created on first use or by the startup warm-up, not at import time
+db_manager = None
+_db_manager_lock = threading.Lock()
+# Set once the database is connected and the pipeline has been warmed up
+_ready = threading.Event()
+# Set on shutdown to stop warm-up retries
+_shutting_down = threading.Event()
+
+
+def get_db_manager():
+    """Returns the shared DatabaseManager, connecting on first use."""
+    global db_manager
+    if db_manager is None:
+        with _db_manager_lock:
+            if db_manager is None:
+                db_manager = DatabaseManager()
+    return db_manager
+
+
+def _warm_up():
+    """Connects to the database and warms up the recognition pipeline.
+
+    Failed attempts, e.g. while the database is still starting, are retried
+    with exponential backoff until one succeeds or the app shuts down.
+    """
+    start_time = time.perf_counter()
+    delay = config.WARM_UP_RETRY_DELAY
+    while not _shutting_down.is_set():
+        try:
+            get_db_manager()
+            recognizer.warm_up()
+            _ready.set()
+            logger.info(
+                "api.app.warm_up :: Ready after %.2f seconds",
+                time.perf_counter() - start_time,
+            )
+            return
+        except Exception as e:
+            logger.error(
+                f"api.app.warm_up :: Warm-up failed, retrying in {delay:.0f}s: {e}"
+            )
+        _shutting_down.wait(delay)
+        delay = min(delay * 2, config.WARM_UP_MAX_RETRY_DELAY)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background so the server starts accepting connections at once
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    yield
+    _shutting_down.set()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once warm-up has finished, 503 until then."""
+    if not _ready.is_set():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Warming up"
+        )
+    return {"status": "ready"}
+
+
+def _mount_gradio(app):
+    """Serves the Gradio interface from this app at config.GRADIO_PATH.
+
+    Gradio is optional: without it installed, or with GRADIO_PATH empty, the
+    API is served alone.
+    """
+    if not config.GRADIO_PATH:
+        return app
+    try:
+        import gradio as gr
+    except ImportError:
+        logger.info("api.app :: Gradio is not installed; interface not mounted")
+        return app
+    from api import gradio_app
+
+    interface = gradio_app.create_interface(get_db_manager)
+    return gr.mount_gradio_app(app, interface, path=config.GRADIO_PATH)
 
 
 @app.post(
@@ -21,6 +104,7 @@ db_manager = DatabaseManager()
 async def create_song(song: schemas.SongCreate):
     """Adds a new song to the database."""
     logger.info(f"api.app.create_song :: Received request to add song: {song}")
+    db_manager = get_db_manager()
     song_id = db_manager.add_song(song.title, song.artist)
     if song_id is None:
         raise HTTPException(
@@ -31,67 +115,63 @@ async def create_song(song: schemas.SongCreate):
     return created_song
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Exposes pipeline latency histograms and counters in Prometheus format."""
+    payload, content_type = metrics.render_latest()
+    return Response(content=payload, media_type=content_type)
+
+
 @app.post("/recognize/", response_model=schemas.RecognitionResponse)
-async def recognize_audio(file: UploadFile):
+async def recognize_audio(file: UploadFile, response: Response):
     """Recognizes the audio and returns song information."""
     logger.info("api.app.recognize_audio :: Received audio recognition request")
+    timings = metrics.start_request_timing()
+    start_time = time.perf_counter()
+    error = None
     try:
-        # Load audio
-        import io  # ADDED
-
-        audio_bytes = await file.read()  # Read audio bytes from SpooledTemporaryFile
-        audio, sr = processing.load_audio(io.BytesIO(audio_bytes))
-        if audio is None:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid audio file"
-            )
-
-        # Create spectrogram
-        spectrogram = processing.create_spectrogram(audio)
-        if spectrogram is None:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create spectrogram",
-            )
-
-        # Extract peaks
-        peaks = processing.extract_peaks(spectrogram)
-
-        # Create fingerprints
-        fingerprints = fingerprinting.create_fingerprint(
-            peaks, song_id=0
-        )  # Use a dummy song_id for recognition
-
-        # Limit the number of fingerprints to use for matching
-        if len(fingerprints) > config.NUM_FINGERPRINTS_TO_USE:
-            fingerprints = random.sample(fingerprints, config.NUM_FINGERPRINTS_TO_USE)
-            logger.debug(
-                f"api.app.recognize_audio :: Limited fingerprints to {config.NUM_FINGERPRINTS_TO_USE}"
-            )
-
-        # Match fingerprints
-        matches = matcher.match_fingerprints(fingerprints)
-        best_song_id, offset = matcher.get_best_match(matches)
-
-        if best_song_id is None:
-            return schemas.RecognitionResponse(song_id=None, title=None, artist=None)
-
-        song = db_manager.get_song_by_id(best_song_id)
-
-        if song is None:
-            logger.error(
-                f"api.app.recognize_audio :: Song ID not found: {best_song_id}"
-            )
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Song not found"
-            )
-
-        return schemas.RecognitionResponse(
-            song_id=song.id, title=song.title, artist=song.artist
+        audio_bytes = await file.read()
+        with profiling.maybe_profile_request("recognize"):
+            return _recognize(audio_bytes)
+    except HTTPException as e:
+        error = e
+        raise
+    finally:
+        elapsed = time.perf_counter() - start_time
+        metrics.RECOGNITION_LATENCY.observe(elapsed)
+        if config.RECOGNITION_TIMING_HEADER:
+            timings["total"] = elapsed
+            server_timing = metrics.format_server_timing(timings)
+            response.headers["Server-Timing"] = server_timing
+            if error is not None:
+                # Error responses are built from the exception, not from response
+                error.headers = {
+                    **(error.headers or {}),
+                    "Server-Timing": server_timing,
+                }
+
+
+def _recognize(audio_bytes):
+    """Runs the recognition pipeline on uploaded audio bytes."""
+    try:
+        song = recognizer.recognize(io.BytesIO(audio_bytes), get_db_manager())
+    except recognizer.InvalidAudioError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except recognizer.SongNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Song not found"
         )
-
     except Exception as e:
         logger.error(f"api.app.recognize_audio :: Error during recognition: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
         )
+
+    if song is None:
+        return schemas.RecognitionResponse(song_id=None, title=None, artist=None)
+    return schemas.RecognitionResponse(
+        song_id=song.id, title=song.title, artist=song.artist
+    )
+
+
+app = _mount_gradio(app)
@@ -1,54 +1,55 @@
 import gradio as gr
-from fastapi import FastAPI, UploadFile, HTTPException
-import uvicorn
-import asyncio
-from io import BytesIO  # Import BytesIO
-import requests  # Import the requests library
 
+from matching import recognizer
 from utils.logger import logger
 
-# Create a FastAPI app instance
-app = FastAPI()
 
-# Define the Gradio interface
-def recognize_audio_interface(audio_file):
-    """Recognizes audio via Gradio, using direct POST to the /recognize endpoint."""
-    logger.info("api.gradio_app.recognize_audio_interface :: Running Gradio interface")
-    try:
-        if not audio_file:
-            return "Please provide an audio file."
+def create_interface(get_db_manager):
+    """Builds the Gradio recognition interface.
 
-        # Read the audio file into bytes
-        with open(audio_file, "rb") as f:
-            audio_bytes = f.read()
+    The interface runs the recognition pipeline in-process on the uploaded or
+    recorded file, with no HTTP round trip to the API.
 
-        # Create a multipart form to send the file
-        files = {"file": ("audio.wav", BytesIO(audio_bytes), "audio/wav")}  # Set content type to audio/wav
+    Args:
+        get_db_manager (callable): Returns the DatabaseManager to match against.
 
-        # Make a POST request to the /recognize endpoint in FastAPI
-        response = requests.post("http://localhost:8000/recognize/", files=files)  # Updated URL
+    Returns:
+        gr.Interface: The interface, ready to launch or mount on a FastAPI app.
+    """
 
-        if response.status_code == 200:
-            result = response.json()
-            if result and result.get("song_id"):  # Safely check for song_id
-                return f"Song ID: {result['song_id']}, Title: {result['title']}, Artist: {result['artist']}"
-            else:
+    def recognize_audio_interface(audio_file):
+        """Recognizes audio via Gradio, calling the recognition pipeline directly."""
+        logger.info(
+            "api.gradio_app.recognize_audio_interface :: Running Gradio interface"
+        )
+        try:
+            if not audio_file:
+                return "Please provide an audio file."
+
+            song = recognizer.recognize(audio_file, get_db_manager())
+            if song is None:
                 return "No match found."
-        else:
-            logger.error(f"api.gradio_app.recognize_audio_interface :: Error from /recognize endpoint: {response.status_code} - {response.text}")
-            return f"Error: {response.status_code} - {response.text}"
-
-    except Exception as e:
-        logger.error(f"api.gradio_app.recognize_audio_interface :: Error in Gradio interface: {e}")
-        return f"Error: {str(e)}"
-
-iface = gr.Interface(
-    fn=recognize_audio_interface,
-    inputs=gr.Audio(type="filepath"),
-    outputs="text",
-    title="SonicSherlock Audio Recognition",
-    description="Upload an audio file or record from your microphone to identify the song."
-)
-
-# Launch the Gradio app (standalone - Uvicorn is NOT needed here)
-iface.launch(server_name="0.0.0.0", server_port=8001)
+            return f"Song ID: {song.id}, Title: {song.title}, Artist: {song.artist}"
+
+        except Exception as e:
+            logger.error(
+                f"api.gradio_app.recognize_audio_interface :: Error in Gradio interface: {e}"
+            )
+            return f"Error: {str(e)}"
+
+    return gr.Interface(
+        fn=recognize_audio_interface,
+        inputs=gr.Audio(type="filepath"),
+        outputs="text",
+        title="SonicSherlock Audio Recognition",
+        description="Upload an audio file or record from your microphone to identify the song.",
+    )
+
+
+if __name__ == "__main__":
+    # Standalone mode: serve only the Gradio interface, still recognizing in-process
+    from database.database_manager import DatabaseManager
+
+    db_manager = DatabaseManager()
+    iface = create_interface(lambda: db_manager)
+    iface.launch(server_name="0.0.0.0", server_port=8001)
@@ -0,0 +1,273 @@
+import threading
+
+import numpy as np
+
+from audio import fingerprinting
+from audio import processing
+from config import config
+from utils.logger import logger
+from utils.metrics import track_stage
+
+# Floor and dynamic range of the dB conversion, as in librosa.amplitude_to_db
+_AMIN = 1e-5
+_TOP_DB = 80.0
+# numpy 2 can write FFT results into a preallocated array. numpy.fft computes
+# in double precision, so the frame and spectrum buffers are float64/complex128
+# to avoid a hidden upcast copy on every call.
+_RFFT_SUPPORTS_OUT = np.lib.NumpyVersion(np.__version__) >= "2.0.0"
+# Frames windowed and transformed at a time. The float64 frames and complex128
+# spectrum take 32 KiB per frame at the default window size, so the STFT runs
+# in fixed-size blocks rather than over the whole clip at once.
+_STFT_BLOCK_FRAMES = 128
+
+_thread_local = threading.local()
+
+
+class FingerprintPipeline:
+    """Turns audio into fingerprints: load, spectrogram, peaks, fingerprints.
+
+    The STFT window is computed once, and the STFT runs in fixed-size blocks of
+    frames through two small reused buffers. The padded signal, dB spectrogram
+    and peak-filter outputs live in work buffers that are reused across clips
+    and grow with the clip, up to PIPELINE_MAX_RETAINED_SECONDS of audio.
+    Steady-state processing of query-length clips therefore allocates next to
+    nothing, while longer clips (e.g. whole songs at ingest) get temporary
+    arrays that are freed once the caller drops the result.
+
+    The buffers make an instance unsafe to share between threads. Keep one per
+    worker thread, e.g. via default_pipeline(). Arrays returned by spectrogram()
+    are views of those buffers and are overwritten by the next call.
+
+    The output matches processing.create_spectrogram / extract_peaks (a
+    centered, zero-padded Hann STFT in dB relative to the loudest bin), so
+    fingerprints stay compatible with existing catalogs when the default
+    parameters are used.
+    """
+
+    def __init__(
+        self,
+        sample_rate=None,
+        fft_window_size=None,
+        hop_length=None,
+        peak_threshold=None,
+        max_filter_size=None,
+        target_zone_size=None,
+    ):
+        """Creates a pipeline; parameters default to the values in config."""
+        self.sample_rate = sample_rate or config.SAMPLE_RATE
+        self.fft_window_size = fft_window_size or config.FFT_WINDOW_SIZE
+        self.hop_length = hop_length or config.HOP_LENGTH
+        self.peak_threshold = (
+            config.PEAK_THRESHOLD if peak_threshold is None else peak_threshold
+        )
+        self.max_filter_size = max_filter_size or config.MAX_FILTER_SIZE
+        self.target_zone_size = target_zone_size or config.TARGET_ZONE_SIZE
+
+        # Periodic Hann window, as scipy.signal.get_window("hann", n, fftbins=True)
+        n = np.arange(self.fft_window_size, dtype=np.float64)
+        self.window = (
+            0.5 - 0.5 * np.cos(2.0 * np.pi * n / self.fft_window_size)
+        ).astype(np.float32)
+        self.num_bins = self.fft_window_size // 2 + 1
+        self._frames = np.empty(
+            (_STFT_BLOCK_FRAMES, self.fft_window_size), dtype=np.float64
+        )
+        self._spectrum = np.empty(
+            (_STFT_BLOCK_FRAMES, self.num_bins), dtype=np.complex128
+        )
+        self.max_retained_frames = (
+            1
+            + config.PIPELINE_MAX_RETAINED_SECONDS * self.sample_rate // self.hop_length
+        )
+        self._capacity = 0  # Number of frames the buffers can hold
+
+    def _ensure_capacity(self, num_frames):
+        """Grows the work buffers so they can hold num_frames frames.
+
+        The buffers never grow past max_retained_frames.
+
+        Returns:
+            bool: True if the buffers can hold num_frames frames.
+        """
+        if num_frames <= self._capacity:
+            return True
+        if num_frames > self.max_retained_frames:
+            return False
+        # Grow with headroom so slightly longer clips do not reallocate again
+        capacity = min(
+            max(num_frames, int(self._capacity * 1.25)), self.max_retained_frames
+        )
+        padded_length = (capacity - 1) * self.hop_length + self.fft_window_size
+        self._padded = np.zeros(padded_length, dtype=np.float32)
+        self._spectrogram = np.empty((capacity, self.num_bins), dtype=np.float32)
+        self._filtered = np.empty((capacity, self.num_bins), dtype=np.float32)
+        self._is_peak = np.empty((capacity, self.num_bins), dtype=bool)
+        self._above_threshold = np.empty((capacity, self.num_bins), dtype=bool)
+        self._capacity = capacity
+        logger.debug(
+            "audio.pipeline.FingerprintPipeline :: Work buffers grown to %s frames",
+            capacity,
+        )
+
+    def load(self, source):
+        """Loads and resamples audio from a path or file-like object.
+
+        Returns:
+            np.ndarray: Mono float32 audio, or None if it cannot be decoded.
+        """
+        audio, _ = processing.load_audio(source, sample_rate=self.sample_rate)
+        return audio
+
+    def spectrogram(self, audio):
+        """Computes the dB spectrogram of audio into the reusable buffers.
+
+        Args:
+            audio (np.ndarray): Mono audio at self.sample_rate.
+
+        Returns:
+            np.ndarray: A (frequency bins, frames) float32 view, valid until the
+                next call for clips up to max_retained_frames frames, or None if
+                it could not be computed.
+        """
+        logger.debug("audio.pipeline.FingerprintPipeline :: Creating spectrogram")
+        try:
+            with track_stage("stft"):
+                # Center the frames with zero padding, as librosa.stft(center=True)
+                half_window = self.fft_window_size // 2
+                padded_length = len(audio) + 2 * half_window
+                if padded_length < self.fft_window_size:
+                    raise ValueError("Audio is shorter than one FFT window")
+                num_frames = (
+                    1 + (padded_length - self.fft_window_size) // self.hop_length
+                )
+                if self._ensure_capacity(num_frames):
+                    padded = self._padded[:padded_length]
+                    spectrogram = self._spectrogram[:num_frames]
+                else:
+                    # Too long to keep buffers for; these go with the result
+                    padded = np.empty(padded_length, dtype=np.float32)
+                    spectrogram = np.empty((num_frames, self.num_bins), np.float32)
+                padded[:half_window] = 0.0
+                padded[half_window : half_window + len(audio)] = audio
+                padded[half_window + len(audio) :] = 0.0
+
+                frame_view = np.lib.stride_tricks.sliding_window_view(
+                    padded, self.fft_window_size
+                )[:: self.hop_length]
+                for start in range(0, num_frames, _STFT_BLOCK_FRAMES):
+                    stop = min(start + _STFT_BLOCK_FRAMES, num_frames)
+                    frames = self._frames[: stop - start]
+                    np.multiply(frame_view[start:stop], self.window, out=frames)
+                    spectrum = self._spectrum[: stop - start]
+                    if _RFFT_SUPPORTS_OUT:
+                        np.fft.rfft(frames, axis=1, out=spectrum)
+                    else:
+                        spectrum[...] = np.fft.rfft(frames, axis=1)
+                    np.abs(spectrum, out=spectrogram[start:stop])
+
+                # Same arithmetic as librosa.amplitude_to_db(|S|, ref=np.max)
+                ref_power = max(_AMIN**2, float(spectrogram.max()) ** 2)
+                np.square(spectrogram, out=spectrogram)
+                np.maximum(spectrogram, _AMIN**2, out=spectrogram)
+                np.log10(spectrogram, out=spectrogram)
+                spectrogram *= 10.0
+                spectrogram -= 10.0 * np.log10(ref_power)
+                np.maximum(spectrogram, spectrogram.max() - _TOP_DB, out=spectrogram)
+
+            spectrogram_db = spectrogram.T
+            if config.SAVE_SPECTROGRAM_PLOT:
+                processing.save_spectrogram_plot(spectrogram_db)
+            logger.debug(
+                "audio.pipeline.FingerprintPipeline :: Spectrogram created. Shape: %s",
+                spectrogram_db.shape,
+            )
+            return spectrogram_db
+        except Exception as e:
+            logger.error(
+                f"audio.pipeline.FingerprintPipeline :: Error creating spectrogram: {e}"
+            )
+            return None
+
+    def peaks(self, spectrogram_db):
+        """Finds local maxima above the peak threshold.
+
+        Args:
+            spectrogram_db (np.ndarray): A spectrogram returned by spectrogram().
+
+        Returns:
+            list: (time, frequency) tuples, ordered by frequency then time.
+        """
+        logger.debug("audio.pipeline.FingerprintPipeline :: Extracting peaks")
+        try:
+            from scipy.ndimage import maximum_filter
+
+            with track_stage("peaks"):
+                # Work in the buffers' (frames, bins) layout; the filter is square
+                spectrogram = spectrogram_db.T
+                num_frames = spectrogram.shape[0]
+                if num_frames <= self._capacity:
+                    filtered = self._filtered[:num_frames]
+                    is_peak = self._is_peak[:num_frames]
+                    above_threshold = self._above_threshold[:num_frames]
+                else:
+                    # Longer than the retained buffers; freed on return
+                    filtered = np.empty_like(spectrogram)
+                    is_peak = np.empty(spectrogram.shape, dtype=bool)
+                    above_threshold = np.empty(spectrogram.shape, dtype=bool)
+                maximum_filter(spectrogram, size=self.max_filter_size, output=filtered)
+                np.equal(filtered, spectrogram, out=is_peak)
+                np.greater(spectrogram, self.peak_threshold, out=above_threshold)
+                np.logical_and(is_peak, above_threshold, out=is_peak)
+                # Transpose back so peaks come out in (frequency, time) order
+                rows, cols = np.nonzero(is_peak.T)
+                peaks = list(zip(cols.tolist(), rows.tolist()))
+            logger.debug(
+                "audio.pipeline.FingerprintPipeline :: Found %s peaks.", len(peaks)
+            )
+            return peaks
+        except Exception as e:
+            logger.error(
+                f"audio.pipeline.FingerprintPipeline :: Error extracting peaks: {e}"
+            )
+            return []
+
+    def fingerprints(self, peaks, song_id):
+        """Hashes peak pairs into fingerprints for song_id."""
+        return fingerprinting.create_fingerprint(
+            peaks, song_id, target_zone_size=self.target_zone_size
+        )
+
+    def fingerprint_audio(self, audio, song_id):
+        """Runs spectrogram, peaks and fingerprints on loaded audio.
+
+        Returns:
+            list: Fingerprint dictionaries, or None if the spectrogram failed.
+        """
+        spectrogram_db = self.spectrogram(audio)
+        if spectrogram_db is None:
+            return None
+        return self.fingerprints(self.peaks(spectrogram_db), song_id)
+
+    def fingerprint_file(self, source, song_id):
+        """Runs the whole pipeline on a path or file-like object.
+
+        Returns:
+            list: Fingerprint dictionaries, or None if the audio could not be
+                loaded or its spectrogram could not be computed.
+        """
+        audio = self.load(source)
+        if audio is None:
+            return None
+        return self.fingerprint_audio(audio, song_id)
+
+
+def default_pipeline():
+    """Returns the calling thread's FingerprintPipeline with config parameters.
+
+    Each thread gets its own instance, so the work buffers are never shared.
+    """
+    pipeline = getattr(_thread_local, "pipeline", None)
+    if pipeline is None:
+        pipeline = FingerprintPipeline()
+        _thread_local.pipeline = pipeline
+    return pipeline
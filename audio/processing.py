@@ -1,28 +1,40 @@
-import librosa
-import librosa.display
 import numpy as np
-from scipy.ndimage import maximum_filter
 
 from config import config
 from utils.logger import logger
-import matplotlib.pyplot as plt
+from utils.metrics import track_stage
 
+# librosa, scipy.ndimage and matplotlib are imported inside the functions that
+# use them, so importing this module (and everything that imports it) stays fast.
 
-def load_audio(file_path):
+
+def load_audio(file_path, sample_rate=None):
     """Loads an audio file using librosa.
 
     Args:
         file_path (str): Path to the audio file.
+        sample_rate (int, optional): Rate to resample to. Defaults to config.SAMPLE_RATE.
 
     Returns:
         tuple: A tuple containing the audio data as a numpy array and the sample rate.
                Returns None, None if loading fails.
     """
-    logger.debug(f"audio.processing.load_audio :: Loading audio from {file_path}")
+    logger.debug("audio.processing.load_audio :: Loading audio from %s", file_path)
     try:
-        audio, sr = librosa.load(file_path, sr=config.SAMPLE_RATE, mono=True)
+        import librosa
+
+        sample_rate = sample_rate or config.SAMPLE_RATE
+        # Decode at the native rate, then resample, so each stage is timed separately
+        with track_stage("decode"):
+            audio, sr = librosa.load(file_path, sr=None, mono=True)
+        if sr != sample_rate:
+            with track_stage("resample"):
+                audio = librosa.resample(audio, orig_sr=sr, target_sr=sample_rate)
+            sr = sample_rate
         logger.debug(
-            f"audio.processing.load_audio :: Audio loaded successfully. Sample rate: {sr}, Length: {len(audio)}"
+            "audio.processing.load_audio :: Audio loaded successfully. Sample rate: %s, Length: %s",
+            sr,
+            len(audio),
         )
         return audio, sr
     except Exception as e:
@@ -44,7 +56,8 @@ def normalize_audio(audio):
         max_amplitude = np.max(np.abs(audio))
         normalized_audio = audio / max_amplitude
         logger.debug(
-            f"audio.processing.normalize_audio :: Audio normalized. Max amplitude: {max_amplitude}"
+            "audio.processing.normalize_audio :: Audio normalized. Max amplitude: %s",
+            max_amplitude,
         )
         return normalized_audio
     except Exception as e:
@@ -66,24 +79,20 @@ def create_spectrogram(audio):
     """
     logger.debug("audio.processing.create_spectrogram :: Creating spectrogram")
     try:
-        spectrogram = librosa.stft(
-            audio, n_fft=config.FFT_WINDOW_SIZE, hop_length=config.HOP_LENGTH
-        )
-        spectrogram_db = librosa.amplitude_to_db(np.abs(spectrogram), ref=np.max)
+        import librosa
 
-        # Add visualization code here
-        plt.figure(figsize=(12, 4))
-        librosa.display.specshow(
-            spectrogram_db, sr=config.SAMPLE_RATE, x_axis="time", y_axis="hz"
-        )
-        plt.colorbar()
-        plt.title("Spectrogram")
-        plt.tight_layout()
-        plt.savefig("spectrogram.png")  # Save the spectrogram to a file
-        plt.close()  # Close the plot to free memory
+        with track_stage("stft"):
+            spectrogram = librosa.stft(
+                audio, n_fft=config.FFT_WINDOW_SIZE, hop_length=config.HOP_LENGTH
+            )
+            spectrogram_db = librosa.amplitude_to_db(np.abs(spectrogram), ref=np.max)
+
+        if config.SAVE_SPECTROGRAM_PLOT:
+            save_spectrogram_plot(spectrogram_db)
 
         logger.debug(
-            f"audio.processing.create_spectrogram :: Spectrogram created. Shape: {spectrogram_db.shape}"
+            "audio.processing.create_spectrogram :: Spectrogram created. Shape: %s",
+            spectrogram_db.shape,
         )
         return spectrogram_db
     except Exception as e:
@@ -93,6 +102,30 @@ def create_spectrogram(audio):
         return None
 
 
+def save_spectrogram_plot(spectrogram_db, path="spectrogram.png"):
+    """Saves a spectrogram as an image, for debugging.
+
+    Args:
+        spectrogram_db (np.ndarray): The spectrogram in dB.
+        path (str): The output image path.
+    """
+    import librosa.display
+    import matplotlib
+
+    matplotlib.use("Agg")  # Render off-screen; no display in servers or workers
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 4))
+    librosa.display.specshow(
+        spectrogram_db, sr=config.SAMPLE_RATE, x_axis="time", y_axis="hz"
+    )
+    plt.colorbar()
+    plt.title("Spectrogram")
+    plt.tight_layout()
+    plt.savefig(path)  # Save the spectrogram to a file
+    plt.close()  # Close the plot to free memory
+
+
 def extract_peaks(spectrogram):
     """Extracts peaks from the spectrogram using a maximum filter.
 
@@ -104,17 +137,22 @@ def extract_peaks(spectrogram):
     """
     logger.debug("audio.processing.extract_peaks :: Extracting peaks from spectrogram")
     try:
-        # Apply maximum filter to find local maxima
-        peaks = maximum_filter(spectrogram, size=config.MAX_FILTER_SIZE) == spectrogram
-        # Get the indices of the peaks
-        rows, cols = np.where(peaks)
-        # Filter peaks based on the threshold
-        peaks_db = [
-            (col, row)
-            for col, row in zip(cols, rows)
-            if spectrogram[row, col] > config.PEAK_THRESHOLD
-        ]
-        logger.debug(f"audio.processing.extract_peaks :: Found {len(peaks_db)} peaks.")
+        from scipy.ndimage import maximum_filter
+
+        with track_stage("peaks"):
+            # Apply maximum filter to find local maxima
+            peaks = (
+                maximum_filter(spectrogram, size=config.MAX_FILTER_SIZE) == spectrogram
+            )
+            # Get the indices of the peaks
+            rows, cols = np.where(peaks)
+            # Filter peaks based on the threshold
+            peaks_db = [
+                (col, row)
+                for col, row in zip(cols, rows)
+                if spectrogram[row, col] > config.PEAK_THRESHOLD
+            ]
+        logger.debug("audio.processing.extract_peaks :: Found %s peaks.", len(peaks_db))
         return peaks_db
     except Exception as e:
         logger.error(f"audio.processing.extract_peaks :: Error extracting peaks: {e}")
@@ -0,0 +1,441 @@
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import click
+import numpy as np
+import soundfile as sf
+from prometheus_client import REGISTRY
+
+from add_songs import extract_artist_title, fingerprint_file
+from benchmarks import synthetic
+from database.database_manager import DatabaseManager
+from matching import recognizer
+from utils.logger import logger
+
+PIPELINE_STAGES = (
+    "decode",
+    "resample",
+    "stft",
+    "peaks",
+    "fingerprint",
+    "db_lookup",
+    "scoring",
+    "metadata",
+)
+# (section, key, higher_is_better) pairs shown by the compare command
+COMPARED_METRICS = (
+    ("ingest", "rows_per_sec", True),
+    ("ingest", "tracks_per_sec", True),
+    ("recognition", "p50_ms", False),
+    ("recognition", "p95_ms", False),
+    ("recognition", "p99_ms", False),
+    ("concurrency", "queries_per_sec", True),
+    ("memory", "tracemalloc_peak_mb", False),
+    ("memory", "max_rss_mb", False),
+    ("accuracy", "overall", True),
+    ("cold_start", "import_api_seconds", False),
+    ("cold_start", "import_cli_seconds", False),
+    ("cold_start", "warm_up_seconds", False),
+)
+# Snippets timed in a fresh interpreter by measure_cold_start
+COLD_START_SNIPPETS = {
+    "import_api_seconds": "import api.app",
+    "import_cli_seconds": "import cli",
+    "warm_up_seconds": "from matching import recognizer; recognizer.warm_up()",
+}
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _git_commit():
+    """Returns the current git commit hash, or None outside a git checkout."""
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except Exception:
+        return None
+
+
+def _percentiles_ms(latencies):
+    """Summarizes a list of latencies (seconds) in milliseconds."""
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "count": len(latencies),
+        "mean_ms": float(np.mean(latencies_ms)),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(np.max(latencies_ms)),
+    }
+
+
+def _stage_totals():
+    """Returns the cumulative (count, seconds) of every pipeline stage so far."""
+    totals = {}
+    for stage in PIPELINE_STAGES:
+        labels = {"stage": stage}
+        count = REGISTRY.get_sample_value(
+            "sonicsherlock_stage_duration_seconds_count", labels
+        )
+        total = REGISTRY.get_sample_value(
+            "sonicsherlock_stage_duration_seconds_sum", labels
+        )
+        totals[stage] = (count or 0.0, total or 0.0)
+    return totals
+
+
+def _stage_means_ms(before, after):
+    """Returns the mean per-call time of each stage between two snapshots."""
+    means = {}
+    for stage in PIPELINE_STAGES:
+        calls = after[stage][0] - before[stage][0]
+        seconds = after[stage][1] - before[stage][1]
+        if calls:
+            means[stage] = seconds / calls * 1000
+    return means
+
+
+def _recognize_query(db_manager, audio_bytes):
+    """Recognizes one query clip, returning (song_id or None, seconds)."""
+    start_time = time.perf_counter()
+    try:
+        song = recognizer.recognize(io.BytesIO(audio_bytes), db_manager)
+        song_id = song.id if song is not None else None
+    except Exception as e:
+        logger.error(f"benchmarks.run :: Recognition failed: {e}")
+        song_id = None
+    return song_id, time.perf_counter() - start_time
+
+
+def measure_cold_start():
+    """Times imports and the pipeline warm-up, each in a fresh interpreter.
+
+    Returns:
+        dict: Seconds per entry in COLD_START_SNIPPETS (None if it failed).
+    """
+    env = dict(os.environ, LOG_LEVEL="WARNING", LOG_FILE=os.devnull)
+    cold_start = {}
+    for name, snippet in COLD_START_SNIPPETS.items():
+        script = (
+            "import time; start = time.perf_counter(); "
+            f"{snippet}; print('COLD_START', time.perf_counter() - start)"
+        )
+        try:
+            output = subprocess.run(
+                [sys.executable, "-c", script],
+                cwd=REPO_ROOT,
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            cold_start[name] = next(
+                float(line.split()[1])
+                for line in output.splitlines()
+                if line.startswith("COLD_START")
+            )
+        except Exception as e:
+            logger.error(f"benchmarks.run :: Cold start of '{snippet}' failed: {e}")
+            cold_start[name] = None
+    return cold_start
+
+
+def ingest_catalog(db_manager, tracks):
+    """Adds and fingerprints every track through the add_songs ingest path.
+
+    Args:
+        db_manager (DatabaseManager): The manager to ingest into.
+        tracks (list): (file_path, artist, title) tuples.
+
+    Returns:
+        tuple: The list of song IDs (None for failures) and the ingest results.
+    """
+    song_ids = []
+    total_rows = 0
+    stages_before = _stage_totals()
+    start_time = time.perf_counter()
+    for file_path, _, _ in tracks:
+        artist, title = extract_artist_title(
+            os.path.splitext(os.path.basename(file_path))[0]
+        )
+        song_id = db_manager.add_song(title, artist)
+        num_fingerprints = fingerprint_file(db_manager, file_path, song_id)
+        song_ids.append(song_id if num_fingerprints is not None else None)
+        total_rows += num_fingerprints or 0
+    elapsed = time.perf_counter() - start_time
+    return song_ids, {
+        "tracks": len(tracks),
+        "failed_tracks": song_ids.count(None),
+        "rows": total_rows,
+        "seconds": elapsed,
+        "rows_per_sec": total_rows / elapsed if elapsed else 0.0,
+        "tracks_per_sec": len(tracks) / elapsed if elapsed else 0.0,
+        "stage_mean_ms": _stage_means_ms(stages_before, _stage_totals()),
+    }
+
+
+def build_queries(tracks, song_ids, queries_per_condition, clip_duration, seed):
+    """Creates degraded query clips for every condition in synthetic.CONDITIONS.
+
+    Args:
+        tracks (list): (file_path, artist, title) tuples.
+        song_ids (list): The song ID of each track.
+        queries_per_condition (int): Number of clips per condition.
+        clip_duration (float): Clip length in seconds.
+        seed (int): Seed for clip selection and degradations.
+
+    Returns:
+        list: (condition, expected_song_id, wav_bytes) tuples.
+    """
+    rng = np.random.default_rng([seed, 1])
+    candidates = [index for index, song_id in enumerate(song_ids) if song_id]
+    track_audio = {}
+    queries = []
+    for condition in synthetic.CONDITIONS:
+        for _ in range(queries_per_condition):
+            track_index = int(rng.choice(candidates))
+            if track_index not in track_audio:
+                track_audio[track_index], _ = sf.read(
+                    tracks[track_index][0], dtype="float32"
+                )
+            clip = synthetic.make_query_clip(
+                track_audio[track_index], condition, clip_duration, rng
+            )
+            queries.append(
+                (condition, song_ids[track_index], synthetic.encode_wav(clip))
+            )
+    return queries
+
+
+def measure_recognition(db_manager, queries):
+    """Recognizes each query sequentially, measuring latency and accuracy."""
+    db_manager.song_cache.clear()
+    db_manager.hash_cache.clear()
+    stages_before = _stage_totals()
+    latencies = []
+    correct = {condition: [] for condition in synthetic.CONDITIONS}
+    for condition, expected_song_id, audio_bytes in queries:
+        song_id, elapsed = _recognize_query(db_manager, audio_bytes)
+        latencies.append(elapsed)
+        correct[condition].append(song_id == expected_song_id)
+
+    recognition = _percentiles_ms(latencies)
+    recognition["stage_mean_ms"] = _stage_means_ms(stages_before, _stage_totals())
+    all_results = [hit for hits in correct.values() for hit in hits]
+    accuracy = {"overall": float(np.mean(all_results))}
+    accuracy.update(
+        {condition: float(np.mean(hits)) for condition, hits in correct.items() if hits}
+    )
+    return recognition, accuracy
+
+
+def measure_concurrency(db_manager, queries, concurrency):
+    """Recognizes all queries on a thread pool and reports throughput."""
+    db_manager.song_cache.clear()
+    db_manager.hash_cache.clear()
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(lambda query: _recognize_query(db_manager, query[2]), queries)
+        )
+    elapsed = time.perf_counter() - start_time
+    concurrent = _percentiles_ms([latency for _, latency in results])
+    concurrent.update(
+        {
+            "workers": concurrency,
+            "seconds": elapsed,
+            "queries_per_sec": len(queries) / elapsed if elapsed else 0.0,
+        }
+    )
+    return concurrent
+
+
+def measure_memory(db_manager, queries):
+    """Tracks the peak Python allocation while recognizing queries."""
+    tracemalloc.start()
+    try:
+        for _, _, audio_bytes in queries:
+            _recognize_query(db_manager, audio_bytes)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        max_rss *= 1024
+    return {
+        "queries": len(queries),
+        "tracemalloc_peak_mb": peak / 2**20,
+        "max_rss_mb": max_rss / 2**20,
+    }
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option("--tracks", default=50, help="Number of synthetic tracks in the catalog.")
+@click.option("--track-duration", default=30.0, help="Length of each track (s).")
+@click.option(
+    "--queries-per-condition", default=10, help="Query clips per degradation."
+)
+@click.option("--clip-duration", default=5.0, help="Length of each query clip (s).")
+@click.option("--concurrency", default=4, help="Worker threads for the throughput run.")
+@click.option("--memory-queries", default=5, help="Queries run under tracemalloc.")
+@click.option("--seed", default=0, help="Seed for the catalog and query clips.")
+@click.option(
+    "--database-url",
+    default=None,
+    help="Database to ingest into. Defaults to a fresh SQLite file in the work dir.",
+)
+@click.option(
+    "--shard-url", multiple=True, help="Fingerprint shard URL (repeat for each shard)."
+)
+@click.option("--work-dir", default=None, help="Directory for tracks and databases.")
+@click.option(
+    "--hash-filter/--no-hash-filter",
+    default=True,
+    help="Build a hash-presence filter after ingest and filter lookups with it.",
+)
+@click.option(
+    "--output",
+    default="benchmark_results.json",
+    help="Where to write the JSON results.",
+)
+def run(
+    tracks,
+    track_duration,
+    queries_per_condition,
+    clip_duration,
+    concurrency,
+    memory_queries,
+    seed,
+    database_url,
+    shard_url,
+    work_dir,
+    hash_filter,
+    output,
+):
+    """Runs the ingest and recognition benchmark on a synthetic catalog."""
+    click.echo("Measuring cold start")
+    cold_start = measure_cold_start()
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix="sonicsherlock-bench-")
+    database_url = database_url or f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    random.seed(seed)  # recognize() samples query fingerprints with random.sample
+
+    click.echo(f"Generating {tracks} synthetic tracks in {work_dir}")
+    catalog = synthetic.write_catalog(
+        os.path.join(work_dir, "songs"), tracks, track_duration, seed
+    )
+    db_manager = DatabaseManager(
+        database_url=database_url,
+        shard_urls=list(shard_url),
+        hash_filter_path=(
+            os.path.join(work_dir, "hash_filter.bin") if hash_filter else ""
+        ),
+    )
+
+    click.echo("Ingesting catalog")
+    song_ids, ingest = ingest_catalog(db_manager, catalog)
+    click.echo(
+        f"Ingested {ingest['rows']} fingerprints at {ingest['rows_per_sec']:.0f} rows/s"
+    )
+
+    if hash_filter:
+        click.echo("Building hash filter")
+        db_manager.build_hash_filter()
+
+    queries = build_queries(
+        catalog, song_ids, queries_per_condition, clip_duration, seed
+    )
+    # Warm up imports, JIT and connections before timing recognition
+    _recognize_query(db_manager, queries[0][2])
+
+    click.echo(f"Recognizing {len(queries)} query clips")
+    recognition, accuracy = measure_recognition(db_manager, queries)
+    click.echo(f"Running {len(queries)} queries on {concurrency} workers")
+    concurrent = measure_concurrency(db_manager, queries, concurrency)
+    memory = measure_memory(db_manager, queries[:memory_queries])
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": database_url.split(":", 1)[0],
+            "shards": len(db_manager.shard_sessions),
+            "params": {
+                "tracks": tracks,
+                "track_duration": track_duration,
+                "queries_per_condition": queries_per_condition,
+                "clip_duration": clip_duration,
+                "concurrency": concurrency,
+                "seed": seed,
+                "hash_filter": hash_filter,
+            },
+        },
+        "ingest": ingest,
+        "recognition": recognition,
+        "concurrency": concurrent,
+        "memory": memory,
+        "accuracy": accuracy,
+        "cold_start": cold_start,
+        "cache": db_manager.cache_stats(),
+        "hash_filter": db_manager.hash_filter_stats(),
+    }
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    click.echo(
+        f"p50 {recognition['p50_ms']:.1f} ms, p95 {recognition['p95_ms']:.1f} ms, "
+        f"p99 {recognition['p99_ms']:.1f} ms, {concurrent['queries_per_sec']:.1f} queries/s, "
+        f"accuracy {accuracy['overall']:.1%}"
+    )
+    click.echo(f"Results written to {output}")
+
+
+@cli.command()
+@click.argument("baseline", type=click.Path(exists=True))
+@click.argument("candidate", type=click.Path(exists=True))
+def compare(baseline, candidate):
+    """Compares two benchmark result files."""
+    with open(baseline) as f:
+        baseline_results = json.load(f)
+    with open(candidate) as f:
+        candidate_results = json.load(f)
+
+    click.echo(f"{'metric':<34}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for section, key, higher_is_better in COMPARED_METRICS:
+        old = baseline_results.get(section, {}).get(key)
+        new = candidate_results.get(section, {}).get(key)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        better = change > 0 if higher_is_better else change < 0
+        marker = "+" if better and change else ("-" if change else " ")
+        click.echo(
+            f"{section + '.' + key:<34}{old:>12.2f}{new:>12.2f}{change:>9.1f}%{marker}"
+        )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,136 @@
+import io
+import os
+
+import numpy as np
+import soundfile as sf
+
+# Sample rate of the generated tracks (Hz); load_audio resamples to config.SAMPLE_RATE
+SYNTH_SAMPLE_RATE = 22050
+# Degradations applied to query clips, in the order they are reported
+CONDITIONS = ("clean", "noise", "gain", "offset", "lossy", "combined")
+
+
+def synthesize_track(track_index, duration, seed=0, sample_rate=SYNTH_SAMPLE_RATE):
+    """Generates a deterministic melodic test track.
+
+    Each track is a sequence of short notes with a few harmonics and a decaying
+    envelope, drawn from a random generator seeded by (seed, track_index), so the
+    same arguments always produce the same audio.
+
+    Args:
+        track_index (int): The index of the track in the catalog.
+        duration (float): Track length in seconds.
+        seed (int): Catalog seed.
+        sample_rate (int): Output sample rate (Hz).
+
+    Returns:
+        np.ndarray: Mono float32 audio in the range -1 to 1.
+    """
+    rng = np.random.default_rng([seed, track_index])
+    num_samples = int(duration * sample_rate)
+    audio = np.zeros(num_samples, dtype=np.float32)
+    position = 0
+    while position < num_samples:
+        note_length = int(rng.uniform(0.1, 0.4) * sample_rate)
+        end = min(position + note_length, num_samples)
+        t = np.arange(end - position, dtype=np.float32) / sample_rate
+        envelope = np.exp(-t * rng.uniform(3.0, 10.0)).astype(np.float32)
+        # One to three simultaneous notes, each with two harmonics
+        for _ in range(rng.integers(1, 4)):
+            frequency = 110.0 * 2 ** (rng.integers(0, 48) / 12.0)
+            for harmonic, weight in ((1, 1.0), (2, 0.5), (3, 0.25)):
+                audio[position:end] += (
+                    weight * envelope * np.sin(2 * np.pi * frequency * harmonic * t)
+                )
+        position = end
+    return (audio / np.max(np.abs(audio)) * 0.9).astype(np.float32)
+
+
+def write_catalog(output_dir, num_tracks, duration, seed=0):
+    """Writes a synthetic catalog of WAV files named "<artist> - <title>.wav".
+
+    Args:
+        output_dir (str): Directory to write the tracks to.
+        num_tracks (int): Number of tracks to generate.
+        duration (float): Length of each track in seconds.
+        seed (int): Catalog seed.
+
+    Returns:
+        list: (file_path, artist, title) tuples, in track index order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    tracks = []
+    for track_index in range(num_tracks):
+        artist = f"Synth Artist {track_index % 10}"
+        title = f"Track {track_index:05d}"
+        file_path = os.path.join(output_dir, f"{artist} - {title}.wav")
+        audio = synthesize_track(track_index, duration, seed)
+        sf.write(file_path, audio, SYNTH_SAMPLE_RATE, subtype="PCM_16")
+        tracks.append((file_path, artist, title))
+    return tracks
+
+
+def lossy_roundtrip(audio, sample_rate=SYNTH_SAMPLE_RATE):
+    """Encodes audio to Ogg Vorbis and decodes it again.
+
+    Args:
+        audio (np.ndarray): Mono float32 audio.
+        sample_rate (int): Sample rate (Hz).
+
+    Returns:
+        np.ndarray: The decoded audio.
+    """
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, format="OGG", subtype="VORBIS")
+    buffer.seek(0)
+    decoded, _ = sf.read(buffer, dtype="float32")
+    return decoded
+
+
+def make_query_clip(
+    track_audio, condition, clip_duration, rng, sample_rate=SYNTH_SAMPLE_RATE
+):
+    """Cuts a clip from a track and applies a degradation.
+
+    Args:
+        track_audio (np.ndarray): The full track.
+        condition (str): One of CONDITIONS.
+        clip_duration (float): Clip length in seconds.
+        rng (np.random.Generator): Source of randomness for the clip.
+        sample_rate (int): Sample rate (Hz).
+
+    Returns:
+        np.ndarray: The degraded clip as float32 audio.
+    """
+    clip_length = int(clip_duration * sample_rate)
+    start = int(rng.integers(0, max(1, len(track_audio) - clip_length)))
+    if condition not in ("offset", "combined"):
+        # Align to whole seconds so only the "offset" conditions test misalignment
+        start -= start % sample_rate
+    clip = track_audio[start : start + clip_length].copy()
+
+    if condition in ("noise", "combined"):
+        snr_db = 10.0
+        signal_power = np.mean(clip**2)
+        noise_power = signal_power / (10 ** (snr_db / 10))
+        clip += rng.normal(0.0, np.sqrt(noise_power), len(clip)).astype(np.float32)
+    if condition in ("gain", "combined"):
+        clip *= 10 ** (rng.uniform(-12.0, -3.0) / 20)
+    if condition in ("lossy", "combined"):
+        clip = lossy_roundtrip(clip, sample_rate)
+    return np.clip(clip, -1.0, 1.0).astype(np.float32)
+
+
+def encode_wav(audio, sample_rate=SYNTH_SAMPLE_RATE):
+    """Encodes audio as in-memory WAV bytes, as an upload would arrive.
+
+    Args:
+        audio (np.ndarray): Mono float32 audio.
+        sample_rate (int): Sample rate (Hz).
+
+    Returns:
+        bytes: The WAV file contents.
+    """
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
@@ -1,8 +1,14 @@
+import cProfile
+import os
+from contextlib import nullcontext
+
 import click
-from audio import processing
-from audio import fingerprinting
+from add_songs import extract_artist_title, fingerprint_file
+from audio.pipeline import FingerprintPipeline, default_pipeline
 from database.database_manager import DatabaseManager
-from database.models import Song, Fingerprint  # Import models
+from matching import recognizer
+from utils import metrics
+from utils import profiling
 from utils.logger import logger
 
 
@@ -11,6 +17,40 @@ def cli():
     pass
 
 
+@cli.command()
+def init_db():
+    """Creates the database tables and indexes."""
+    logger.info("cli.init_db :: Creating database schema")
+    db_manager = DatabaseManager()
+    db_manager.create_schema()
+    click.echo("Database schema is ready.")
+
+
+@cli.command()
+@click.option(
+    "--capacity",
+    type=int,
+    default=None,
+    help="Hashes to size the filter for. Defaults to twice the stored fingerprints.",
+)
+@click.option(
+    "--false-positive-rate",
+    type=float,
+    default=None,
+    help="Target false-positive rate at capacity. Defaults to HASH_FILTER_FALSE_POSITIVE_RATE.",
+)
+def build_hash_filter(capacity, false_positive_rate):
+    """Builds the hash-presence filter from the stored fingerprints."""
+    logger.info("cli.build_hash_filter :: Building hash filter")
+    db_manager = DatabaseManager()
+    stats = db_manager.build_hash_filter(capacity, false_positive_rate)
+    click.echo(
+        f"Hash filter written to {stats['path']}: {stats['num_bits'] // 8} bytes, "
+        f"{stats['num_items']} hashes, estimated false-positive rate "
+        f"{stats['estimated_false_positive_rate']:.4%}"
+    )
+
+
 @cli.command()
 @click.argument("title")
 @click.argument("artist")
@@ -34,26 +74,27 @@ def fingerprint_song(file_path, song_id):
         f"cli.fingerprint_song :: Fingerprinting song: FilePath={file_path}, SongID={song_id}"
     )
     db_manager = DatabaseManager()
+    pipeline = default_pipeline()
     # Load the audio
-    audio, sr = processing.load_audio(file_path)
+    audio = pipeline.load(file_path)
     if audio is None:
         click.echo("Failed to load audio.")
         return
 
-    # Create spectrogram
-    spectrogram = processing.create_spectrogram(audio)
-    if spectrogram is None:
+    # Create spectrogram, extract peaks and fingerprint them
+    fingerprints = pipeline.fingerprint_audio(audio, song_id)
+    if fingerprints is None:
         click.echo("Failed to create spectrogram.")
         return
 
-    # Extract peaks
-    peaks = processing.extract_peaks(spectrogram)
-
-    # Create fingerprints
-    fingerprints = fingerprinting.create_fingerprint(peaks, song_id)
-
     # Store the fingerprints
-    db_manager.store_fingerprints(fingerprints)
+    stored = db_manager.store_fingerprints(fingerprints)
+    if stored != len(fingerprints):
+        click.echo(
+            f"Failed to store fingerprints: stored {stored} of {len(fingerprints)} "
+            f"for song ID {song_id}. See the log for details."
+        )
+        return
     click.echo(f"Fingerprinted {len(fingerprints)} for song ID {song_id}")
 
 
@@ -64,24 +105,204 @@ def clear_database():
         "cli.clear_database :: Clearing all songs and fingerprints from the database"
     )
     db_manager = DatabaseManager()
-    session = db_manager.Session()  # Get a session
-    try:
-        # Delete all fingerprints
-        num_fingerprints_deleted = session.query(Fingerprint).delete()
+    if db_manager.clear_all():
+        click.echo("Successfully cleared all songs and fingerprints from the database.")
+    else:
+        click.echo("Error clearing database. See the log for details.")
+
+
+@cli.command()
+@click.argument("song_ids", nargs=-1, required=True, type=int)
+@click.option(
+    "--batch-size",
+    type=int,
+    default=None,
+    help="Fingerprint rows deleted per transaction. Defaults to MAINTENANCE_BATCH_SIZE.",
+)
+def delete_song(song_ids, batch_size):
+    """Deletes songs and their fingerprints."""
+    db_manager = DatabaseManager()
+    for song_id in song_ids:
+        logger.info(f"cli.delete_song :: Deleting song {song_id}")
+        if db_manager.get_song_by_id(song_id) is None:
+            click.echo(f"Song {song_id} not found.")
+            continue
+        deleted = db_manager.delete_song(song_id, batch_size)
+        if deleted is None:
+            click.echo(f"Failed to delete song {song_id}.")
+        else:
+            click.echo(f"Deleted song {song_id} and {deleted} fingerprints.")
+    if db_manager.hash_filter is not None:
+        click.echo("Run build-hash-filter to drop the deleted hashes from the filter.")
+
+
+@cli.command()
+@click.option(
+    "--song",
+    "songs",
+    multiple=True,
+    required=True,
+    type=(int, click.Path(exists=True)),
+    help="A song ID and the audio file to re-fingerprint it from (repeatable).",
+)
+@click.option("--sample-rate", type=int, default=None, help="Sample rate (Hz).")
+@click.option("--fft-window-size", type=int, default=None, help="FFT frame length.")
+@click.option("--hop-length", type=int, default=None, help="Hop length (samples).")
+@click.option("--peak-threshold", type=float, default=None, help="Peak threshold (dB).")
+@click.option("--max-filter-size", type=int, default=None, help="Peak filter size.")
+@click.option("--target-zone-size", type=int, default=None, help="Peaks per anchor.")
+@click.option(
+    "--batch-size",
+    type=int,
+    default=None,
+    help="Old fingerprint rows deleted per transaction. Defaults to MAINTENANCE_BATCH_SIZE.",
+)
+def refingerprint(
+    songs,
+    sample_rate,
+    fft_window_size,
+    hop_length,
+    peak_threshold,
+    max_filter_size,
+    target_zone_size,
+    batch_size,
+):
+    """Replaces the fingerprints of songs, optionally with new parameters.
+
+    Parameters default to config. Queries only match songs fingerprinted with
+    the same parameters, so update config to match before serving them.
+    """
+    db_manager = DatabaseManager()
+    pipeline = FingerprintPipeline(
+        sample_rate=sample_rate,
+        fft_window_size=fft_window_size,
+        hop_length=hop_length,
+        peak_threshold=peak_threshold,
+        max_filter_size=max_filter_size,
+        target_zone_size=target_zone_size,
+    )
+    for song_id, file_path in songs:
         logger.info(
-            f"cli.clear_database :: Deleted {num_fingerprints_deleted} fingerprints"
+            f"cli.refingerprint :: Re-fingerprinting song {song_id} from {file_path}"
         )
-        # Delete all songs
-        num_songs_deleted = session.query(Song).delete()
-        logger.info(f"cli.clear_database :: Deleted {num_songs_deleted} songs")
-        session.commit()
-        click.echo("Successfully cleared all songs and fingerprints from the database.")
+        if db_manager.get_song_by_id(song_id) is None:
+            click.echo(f"Song {song_id} not found.")
+            continue
+        fingerprints = pipeline.fingerprint_file(file_path, song_id)
+        if not fingerprints:
+            click.echo(f"Failed to fingerprint {file_path}; song {song_id} unchanged.")
+            continue
+        deleted = db_manager.replace_fingerprints(song_id, fingerprints, batch_size)
+        if deleted is None:
+            click.echo(f"Failed to replace the fingerprints of song {song_id}.")
+        else:
+            click.echo(
+                f"Song {song_id}: stored {len(fingerprints)} fingerprints, "
+                f"deleted {deleted} old ones."
+            )
+
+
+def _ingest_file(db_manager, file_path):
+    """Adds a song named after file_path and fingerprints it, like add_songs.py."""
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    artist, title = extract_artist_title(name)
+    song_id = db_manager.add_song(title or name, artist or "Unknown")
+    if song_id:
+        fingerprint_file(db_manager, file_path, song_id)
+
+
+def _recognize_file(db_manager, file_path):
+    """Recognizes file_path, logging instead of raising on bad audio."""
+    try:
+        recognizer.recognize(file_path, db_manager)
     except Exception as e:
-        session.rollback()
-        logger.error(f"cli.clear_database :: Error clearing database: {e}")
-        click.echo(f"Error clearing database: {e}")
-    finally:
-        session.close()
+        logger.error(f"cli.profile :: Error recognizing {file_path}: {e}")
+
+
+@cli.command()
+@click.argument("files", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option(
+    "--mode",
+    type=click.Choice(["recognize", "ingest"]),
+    default="recognize",
+    help="Profile recognition of the files, or adding them to the database.",
+)
+@click.option(
+    "--profiler",
+    type=click.Choice(["cprofile", "sampling"]),
+    default="cprofile",
+    help="Deterministic cProfile, or a low-overhead stack sampler.",
+)
+@click.option("--interval", default=0.005, help="Sampling interval in seconds.")
+@click.option("--repeat", default=1, help="Number of passes over the files.")
+@click.option(
+    "--trace-memory/--no-trace-memory",
+    default=True,
+    help="Track allocations with tracemalloc (slows the run down).",
+)
+@click.option("--output-dir", default="profile_output", help="Where to write reports.")
+@click.option(
+    "--database-url",
+    default=None,
+    help="Database to use. Ingest mode writes songs to it, so consider a scratch database.",
+)
+def profile(
+    files, mode, profiler, interval, repeat, trace_memory, output_dir, database_url
+):
+    """Profiles the fingerprint and match pipeline over FILES."""
+    logger.info(f"cli.profile :: Profiling {mode} of {len(files)} file(s)")
+    db_manager = DatabaseManager(database_url=database_url)
+    run_file = _recognize_file if mode == "recognize" else _ingest_file
+    # Keep one-time import and JIT costs out of the profile (recognition writes nothing)
+    _recognize_file(db_manager, files[0])
+
+    os.makedirs(output_dir, exist_ok=True)
+    stage_profile = metrics.start_stage_profile()
+    if profiler == "cprofile":
+        active_profiler = cProfile.Profile()
+    else:
+        active_profiler = profiling.SamplingProfiler(interval=interval)
+
+    tracker = profiling.trace_allocations() if trace_memory else nullcontext({})
+    with tracker as allocations:
+        active_profiler.enable()
+        try:
+            for _ in range(repeat):
+                for file_path in files:
+                    run_file(db_manager, file_path)
+        finally:
+            active_profiler.disable()
+
+    report = [
+        f"Stage times ({mode}, {len(files)} file(s) x {repeat})",
+        profiling.format_stage_table(stage_profile),
+    ]
+    if allocations:
+        report += [
+            "",
+            f"Peak traced memory: {allocations['peak_bytes'] / 2**20:.1f} MiB",
+            "Top allocation sites:",
+            profiling.format_top_allocations(allocations["snapshot"]),
+        ]
+
+    if profiler == "cprofile":
+        stats_path = os.path.join(output_dir, f"{mode}.prof")
+        active_profiler.dump_stats(stats_path)
+        report += ["", profiling.format_top_functions(active_profiler)]
+        click.echo(
+            f"cProfile stats written to {stats_path} (open with snakeviz or flameprof)"
+        )
+    else:
+        folded_path = os.path.join(output_dir, f"{mode}.folded")
+        active_profiler.write_folded(folded_path)
+        click.echo(
+            f"Folded stacks written to {folded_path} (render with flamegraph.pl or speedscope)"
+        )
+
+    summary = "\n".join(report)
+    with open(os.path.join(output_dir, f"{mode}-summary.txt"), "w") as f:
+        f.write(summary + "\n")
+    click.echo(summary)
 
 
 if __name__ == "__main__":
@@ -1,23 +1,200 @@
-from sqlalchemy import create_engine
+from sqlalchemy import (
+    and_,
+    create_engine,
+    delete,
+    event,
+    func,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import text  # Import the text function
 
+import hashlib
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
 from config import config
+from utils.cache import LRUCache
+from utils.hash_filter import HashFilter
 from utils.logger import logger
-from database.models import Base, Song, Fingerprint
+from utils.metrics import (
+    record_cache_lookups,
+    record_hash_filter_lookups,
+    watch_hash_filter,
+)
+from database.models import Base, CatalogState, Song, Fingerprint
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tunes every new SQLite connection for a read-heavy fingerprint workload."""
+    cursor = dbapi_connection.cursor()
+    for pragma, value in config.SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def create_db_engine(database_url):
+    """Creates a SQLAlchemy engine for a PostgreSQL or SQLite database URL.
+
+    SQLite engines are opened in WAL mode with the pragmas from
+    config.SQLITE_PRAGMAS and may be shared across threads.
+
+    Args:
+        database_url (str): The database URL.
+
+    Returns:
+        Engine: The SQLAlchemy engine.
+    """
+    if database_url.startswith("sqlite"):
+        engine = create_engine(
+            database_url,
+            connect_args={"check_same_thread": False, "timeout": 30},
+        )
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+        return engine
+    return create_engine(database_url)
+
+
+def shard_for_hash(hash_value, num_shards):
+    """Returns the index of the shard that stores a fingerprint hash.
+
+    Args:
+        hash_value (str): The hex fingerprint hash.
+        num_shards (int): The number of shards.
+
+    Returns:
+        int: The shard index in the range [0, num_shards).
+    """
+    if num_shards == 1:
+        return 0
+    prefix = hash_value[: config.SHARD_HASH_PREFIX_LENGTH]
+    return int(prefix, 16) % num_shards
+
+
+def catalog_key(database_url, shard_urls):
+    """Returns an 8-byte key identifying the catalog stored at these URLs.
+
+    The key is written into the hash filter, so a filter built for one
+    database is never used to filter lookups against another.
+    """
+    urls = "\n".join([database_url, *shard_urls])
+    return hashlib.sha256(urls.encode()).digest()[:8]
+
+
+def hash_filter_path_for(database_url, key, path=None):
+    """Returns the absolute path of the hash filter file for a catalog.
+
+    Args:
+        database_url (str): URL of the song database.
+        key (bytes): The catalog key, see catalog_key().
+        path (str, optional): A configured path; relative paths resolve
+            against config.BASE_DIR. None picks a path for the catalog: next to
+            a SQLite database file, else a file in config.BASE_DIR named after
+            the key.
+
+    Returns:
+        str: The absolute path, or "" if path is empty (filter disabled).
+    """
+    if path is None:
+        url = make_url(database_url)
+        if url.get_backend_name() == "sqlite" and url.database not in (
+            None,
+            "",
+            ":memory:",
+        ):
+            # Relative SQLite paths are relative to the working directory, as
+            # for the database itself
+            return os.path.abspath(url.database) + ".hash_filter"
+        path = f"hash_filter-{key.hex()}.bin"
+    if not path:
+        return ""
+    return os.path.abspath(os.path.join(config.BASE_DIR, path))
+
+
+# (database URL, table names or None for all) pairs already created in this process
+_initialized_schemas = set()
 
 
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, database_url=None, shard_urls=None, hash_filter_path=None):
+        """Connects to the song database and the fingerprint shards.
+
+        Args:
+            database_url (str, optional): URL of the song database. Defaults to
+                config.DATABASE_URL.
+            shard_urls (list, optional): URLs of the fingerprint shards. Defaults
+                to config.DATABASE_SHARD_URLS; when empty, fingerprints are stored
+                in the song database.
+            hash_filter_path (str, optional): The hash-presence filter file.
+                Defaults to config.HASH_FILTER_PATH, see hash_filter_path_for();
+                an empty string disables the filter.
+        """
         logger.debug(
             "database.database_manager.DatabaseManager :: Initializing DatabaseManager"
         )
+        database_url = database_url or config.DATABASE_URL
+        if shard_urls is None:
+            shard_urls = config.DATABASE_SHARD_URLS
         try:
-            self.engine = create_engine(config.DATABASE_URL)
-            Base.metadata.create_all(self.engine)
+            self.engine = create_db_engine(database_url)
             self.Session = sessionmaker(bind=self.engine)
+            if shard_urls:
+                self.shard_engines = [create_db_engine(url) for url in shard_urls]
+                self.shard_sessions = [
+                    sessionmaker(bind=shard_engine)
+                    for shard_engine in self.shard_engines
+                ]
+            else:
+                self.shard_engines = [self.engine]
+                self.shard_sessions = [self.Session]
+            if config.AUTO_CREATE_SCHEMA:
+                self.create_schema()
+            # Worker pool for fanning hash lookups out to every shard at once
+            self._shard_executor = (
+                ThreadPoolExecutor(
+                    max_workers=len(self.shard_sessions),
+                    thread_name_prefix="shard-query",
+                )
+                if len(self.shard_sessions) > 1
+                else None
+            )
+            # Caches for song metadata and per-hash (song_id, offset) posting
+            # lists, the latter bounded by the total number of cached rows
+            self.song_cache = LRUCache(
+                config.SONG_CACHE_SIZE, ttl=config.FINGERPRINT_CACHE_TTL
+            )
+            self.hash_cache = LRUCache(
+                config.HASH_CACHE_MAX_ROWS, ttl=config.FINGERPRINT_CACHE_TTL, weigh=len
+            )
+            # Catalog generation the caches were filled at (None: not yet known)
+            self._cache_generation = None
+            self._cache_generation_checked_at = None
+            self._cache_generation_lock = threading.Lock()
+            # Bloom filter that rules out hashes absent from the whole catalog
+            self.catalog_key = catalog_key(database_url, shard_urls)
+            self.hash_filter_path = hash_filter_path_for(
+                database_url,
+                self.catalog_key,
+                (
+                    config.HASH_FILTER_PATH
+                    if hash_filter_path is None
+                    else hash_filter_path
+                ),
+            )
+            self._hash_filter_lock = threading.Lock()
+            self._hash_filter_missing_logged = False
+            self._hash_filter_counts = Counter()
+            self.load_hash_filter()
             logger.debug(
-                "database.database_manager.DatabaseManager :: Database connection established"
+                "database.database_manager.DatabaseManager :: Database connection established (%s fingerprint shard(s))",
+                len(self.shard_sessions),
             )
         except Exception as e:
             logger.critical(
@@ -25,6 +202,308 @@ class DatabaseManager:
             )
             raise  # Re-raise the exception to prevent the application from starting
 
+    def create_schema(self, force=False):
+        """Creates any missing tables and indexes.
+
+        Runs at most once per database per process unless force is set, so
+        constructing further DatabaseManagers does not repeat the checks.
+
+        Args:
+            force (bool): Check the schema even if it was already done.
+        """
+        sharded = self.shard_engines[0] is not self.engine
+        targets = [
+            (
+                self.engine,
+                [Song.__table__, CatalogState.__table__] if sharded else None,
+            )
+        ]
+        if sharded:
+            targets += [
+                (shard_engine, [Fingerprint.__table__])
+                for shard_engine in self.shard_engines
+            ]
+        for engine, tables in targets:
+            key = (
+                engine.url.render_as_string(hide_password=False),
+                tuple(table.name for table in tables) if tables else None,
+            )
+            if key in _initialized_schemas and not force:
+                continue
+            Base.metadata.create_all(engine, tables=tables)
+            _initialized_schemas.add(key)
+            logger.debug(
+                "database.database_manager.DatabaseManager :: Schema ready on %s",
+                engine.url,
+            )
+
+    def _catalog_generation(self):
+        """Reads the catalog generation from the song database.
+
+        Returns:
+            int: The generation, or None if it cannot be read.
+        """
+        try:
+            with self.engine.connect() as connection:
+                generation = connection.execute(
+                    select(CatalogState.__table__.c.generation).where(
+                        CatalogState.__table__.c.id == 1
+                    )
+                ).scalar()
+            return generation or 0
+        except Exception as e:
+            logger.error(
+                f"database.database_manager.DatabaseManager :: Error reading catalog generation: {e}"
+            )
+            return None
+
+    def _bump_catalog_generation(self):
+        """Marks the catalog as changed, invalidating every process's caches.
+
+        Called after the change is committed, so a process that sees the new
+        generation also sees the change. This process re-reads the generation
+        right away; others within config.CATALOG_GENERATION_CHECK_INTERVAL.
+        """
+        catalog_state = CatalogState.__table__
+        increment = (
+            update(catalog_state)
+            .where(catalog_state.c.id == 1)
+            .values(generation=catalog_state.c.generation + 1)
+        )
+        try:
+            with self.engine.begin() as connection:
+                if connection.execute(increment).rowcount:
+                    return
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(insert(catalog_state).values(id=1, generation=1))
+            except IntegrityError:
+                # Another process created the row first
+                with self.engine.begin() as connection:
+                    connection.execute(increment)
+        except Exception as e:
+            logger.error(
+                f"database.database_manager.DatabaseManager :: Error bumping catalog generation: {e}"
+            )
+        finally:
+            self._cache_generation_checked_at = None
+            self._sync_caches()
+
+    def _sync_caches(self):
+        """Clears the caches if the catalog changed since they were filled.
+
+        The generation is read at most every
+        config.CATALOG_GENERATION_CHECK_INTERVAL seconds, so lookups served
+        from the caches do not query the database. Changes made by other
+        processes are therefore picked up within that interval.
+
+        Returns:
+            int: The current generation, to pass to _cache_results, or None if
+                it could not be read, in which case the caches are bypassed.
+        """
+        now = time.monotonic()
+        checked_at = self._cache_generation_checked_at
+        if (
+            checked_at is not None
+            and now - checked_at < config.CATALOG_GENERATION_CHECK_INTERVAL
+        ):
+            return self._cache_generation
+        generation = self._catalog_generation()
+        with self._cache_generation_lock:
+            if (
+                generation is not None
+                and self._cache_generation is not None
+                and generation < self._cache_generation
+            ):
+                # Read before a newer generation that another lookup already saw
+                return self._cache_generation
+            if generation is None or generation != self._cache_generation:
+                self.song_cache.clear()
+                self.hash_cache.clear()
+                self._cache_generation = generation
+            # An unreadable generation is retried on the next lookup
+            self._cache_generation_checked_at = None if generation is None else now
+        return generation
+
+    def _cache_results(self, cache, items, generation):
+        """Caches (key, value) pairs read while the catalog was at generation.
+
+        Nothing is cached if the generation is unknown or the caches have
+        moved on since, as the values may then predate a catalog change.
+        """
+        with self._cache_generation_lock:
+            if generation is None or generation != self._cache_generation:
+                return
+            for key, value in items:
+                cache.put(key, value)
+
+    def load_hash_filter(self):
+        """Memory-maps the hash-presence filter at self.hash_filter_path.
+
+        The filter is disabled while the file is missing, unreadable or was
+        built for a different catalog.
+
+        Returns:
+            HashFilter: The loaded filter, or None if filtering is disabled.
+        """
+        hash_filter = None
+        inode = None
+        try:
+            if self.hash_filter_path and os.path.exists(self.hash_filter_path):
+                inode = os.stat(self.hash_filter_path).st_ino
+                hash_filter = HashFilter.open(self.hash_filter_path)
+                if hash_filter.catalog_key != self.catalog_key:
+                    logger.warning(
+                        "database.database_manager.DatabaseManager :: Ignoring hash filter %s: it was built for a different database",
+                        self.hash_filter_path,
+                    )
+                    hash_filter = None
+        except Exception as e:
+            logger.error(
+                f"database.database_manager.DatabaseManager :: Error loading hash filter: {e}"
+            )
+            hash_filter = None
+        self.hash_filter = hash_filter
+        self._hash_filter_inode = inode
+        self._hash_filter_checked_at = time.monotonic()
+        watch_hash_filter(hash_filter)
+        if hash_filter is not None:
+            logger.info(
+                "database.database_manager.DatabaseManager :: Loaded hash filter %s (%s bits, %s hashes added)",
+                self.hash_filter_path,
+                hash_filter.num_bits,
+                hash_filter.num_items,
+            )
+        return hash_filter
+
+    def _current_hash_filter(self):
+        """Returns the hash filter, reloading it if the file was rebuilt or removed.
+
+        Rebuilding replaces the file, so the inode is checked at most every
+        config.HASH_FILTER_RELOAD_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        if now - self._hash_filter_checked_at < config.HASH_FILTER_RELOAD_INTERVAL:
+            return self.hash_filter
+        with self._hash_filter_lock:
+            if now - self._hash_filter_checked_at >= config.HASH_FILTER_RELOAD_INTERVAL:
+                try:
+                    inode = os.stat(self.hash_filter_path).st_ino
+                except OSError:
+                    inode = None
+                if inode != self._hash_filter_inode:
+                    self.load_hash_filter()
+                else:
+                    self._hash_filter_checked_at = now
+        return self.hash_filter
+
+    def _add_to_hash_filter(self, hash_values):
+        """Adds newly stored hashes to the hash filter file, if there is one.
+
+        The file is mapped writable only for the update; processes that have it
+        mapped read-only see the new bits through the shared page cache. If the
+        file this process loaded has gone, the filter is dropped so lookups of
+        the new hashes are not skipped.
+        """
+        if not self.hash_filter_path or not hash_values:
+            return
+        if not os.path.exists(self.hash_filter_path):
+            if self.hash_filter is not None:
+                logger.error(
+                    "database.database_manager.DatabaseManager :: Hash filter %s was removed; lookups are unfiltered until it is rebuilt with `cli.py build-hash-filter`",
+                    self.hash_filter_path,
+                )
+                with self._hash_filter_lock:
+                    self.load_hash_filter()
+            elif not self._hash_filter_missing_logged:
+                self._hash_filter_missing_logged = True
+                logger.warning(
+                    "database.database_manager.DatabaseManager :: No hash filter at %s, so stored hashes are not added to one; build it with `cli.py build-hash-filter`",
+                    self.hash_filter_path,
+                )
+            return
+        try:
+            with HashFilter.open(self.hash_filter_path, writable=True) as hash_filter:
+                if hash_filter.catalog_key != self.catalog_key:
+                    logger.warning(
+                        "database.database_manager.DatabaseManager :: Not updating hash filter %s: it was built for a different database",
+                        self.hash_filter_path,
+                    )
+                    return
+                hash_filter.add(hash_values)
+                if hash_filter.num_items > hash_filter.capacity:
+                    logger.warning(
+                        "database.database_manager.DatabaseManager :: Hash filter holds %s hashes, over its capacity of %s; rebuild it with `cli.py build-hash-filter` to restore its false-positive rate",
+                        hash_filter.num_items,
+                        hash_filter.capacity,
+                    )
+        except Exception as e:
+            # Lookups of the new hashes would be skipped, so make this loud
+            logger.error(
+                f"database.database_manager.DatabaseManager :: Error updating hash filter, rebuild it with `cli.py build-hash-filter`: {e}"
+            )
+
+    def count_fingerprints(self):
+        """Returns the number of fingerprint rows across all shards."""
+        total = 0
+        for shard_session in self.shard_sessions:
+            session = shard_session()
+            try:
+                total += session.query(func.count(Fingerprint.id)).scalar()
+            finally:
+                session.close()
+        return total
+
+    def build_hash_filter(
+        self, capacity=None, false_positive_rate=None, batch_size=100000
+    ):
+        """Builds the hash-presence filter from every stored fingerprint hash.
+
+        The filter is written to a temporary file and renamed into place, so
+        running API workers switch to it on their next reload check. Fingerprints
+        stored by other processes while the build runs may be missing from it.
+
+        Args:
+            capacity (int, optional): Number of hashes to size the filter for.
+                Defaults to twice the current number of fingerprints, leaving
+                room for growth.
+            false_positive_rate (float, optional): Target false-positive rate at
+                capacity. Defaults to config.HASH_FILTER_FALSE_POSITIVE_RATE.
+            batch_size (int): Hashes read from the database per batch.
+
+        Returns:
+            dict: Stats of the new filter.
+        """
+        if not self.hash_filter_path:
+            raise ValueError("No hash filter path is configured")
+        if capacity is None:
+            capacity = max(2 * self.count_fingerprints(), 100000)
+        false_positive_rate = (
+            false_positive_rate or config.HASH_FILTER_FALSE_POSITIVE_RATE
+        )
+        logger.info(
+            "database.database_manager.DatabaseManager :: Building hash filter %s for %s hashes",
+            self.hash_filter_path,
+            capacity,
+        )
+        temp_path = f"{self.hash_filter_path}.tmp"
+        with HashFilter.create(
+            temp_path, capacity, false_positive_rate, self.catalog_key
+        ) as hash_filter:
+            for shard_session in self.shard_sessions:
+                session = shard_session()
+                try:
+                    # Stream the hashes instead of loading the whole column
+                    result = session.execute(
+                        select(Fingerprint.hash).execution_options(yield_per=batch_size)
+                    )
+                    for hash_values in result.scalars().partitions():
+                        hash_filter.add(hash_values)
+                finally:
+                    session.close()
+        os.replace(temp_path, self.hash_filter_path)
+        return self.load_hash_filter().stats()
+
     def add_song(self, title, artist):
         """Adds a new song to the database.
 
@@ -36,7 +515,9 @@ class DatabaseManager:
             int: The ID of the newly added song.
         """
         logger.debug(
-            f"database.database_manager.DatabaseManager :: Adding song: Title={title}, Artist={artist}"
+            "database.database_manager.DatabaseManager :: Adding song: Title=%s, Artist=%s",
+            title,
+            artist,
         )
         session = self.Session()
         try:
@@ -44,8 +525,11 @@ class DatabaseManager:
             session.add(song)
             session.commit()
             logger.debug(
-                f"database.database_manager.DatabaseManager :: Song added successfully. Song ID: {song.id}"
+                "database.database_manager.DatabaseManager :: Song added successfully. Song ID: %s",
+                song.id,
             )
+            # Write through so the first recognition of this song skips the database
+            self.song_cache.put(song.id, song)
             return song.id
         except Exception as e:
             session.rollback()
@@ -59,34 +543,266 @@ class DatabaseManager:
     def store_fingerprints(self, fingerprints):
         """Stores a list of fingerprints in the database.
 
+        Each fingerprint is routed to the shard that owns its hash prefix.
+
         Args:
             fingerprints (list): A list of fingerprint dictionaries.
+
+        Returns:
+            int: The number of fingerprints stored; less than len(fingerprints)
+                if a shard failed.
         """
         logger.debug(
-            f"database.database_manager.DatabaseManager :: Storing {len(fingerprints)} fingerprints"
+            "database.database_manager.DatabaseManager :: Storing %s fingerprints",
+            len(fingerprints),
         )
-        session = self.Session()
-        try:
-            for fingerprint_data in fingerprints:
-                # Convert 'offset' to a standard Python integer
-                fingerprint_data["offset"] = int(fingerprint_data["offset"])
-                fingerprint = Fingerprint(**fingerprint_data)
-                session.add(fingerprint)
-            session.commit()
+        shard_batches = defaultdict(list)
+        for fingerprint_data in fingerprints:
+            # Convert 'offset' to a standard Python integer
+            fingerprint_data["offset"] = int(fingerprint_data["offset"])
+            shard_index = shard_for_hash(
+                fingerprint_data["hash"], len(self.shard_sessions)
+            )
+            shard_batches[shard_index].append(fingerprint_data)
+
+        stored_hashes = []
+        for shard_index, batch in shard_batches.items():
+            session = self.shard_sessions[shard_index]()
+            try:
+                # Bulk executemany insert instead of one ORM object per row
+                for start in range(0, len(batch), config.INSERT_BATCH_SIZE):
+                    session.execute(
+                        insert(Fingerprint),
+                        batch[start : start + config.INSERT_BATCH_SIZE],
+                    )
+                session.commit()
+                # Drop cached posting lists that are now missing the new rows
+                for fingerprint_data in batch:
+                    self.hash_cache.invalidate(fingerprint_data["hash"])
+                    stored_hashes.append(fingerprint_data["hash"])
+                logger.debug(
+                    "database.database_manager.DatabaseManager :: Stored %s fingerprints in shard %s",
+                    len(batch),
+                    shard_index,
+                )
+            except Exception as e:
+                session.rollback()
+                logger.error(
+                    f"database.database_manager.DatabaseManager :: Error storing fingerprints in shard {shard_index}: {e}"
+                )
+            finally:
+                session.close()
+        self._add_to_hash_filter(stored_hashes)
+        if stored_hashes:
+            self._bump_catalog_generation()
+        return len(stored_hashes)
+
+    def _max_fingerprint_ids(self, song_id):
+        """Returns the highest fingerprint row ID of song_id in each shard.
+
+        Returns:
+            list: One ID per shard, None for shards without rows for the song.
+        """
+        fingerprints = Fingerprint.__table__
+        max_ids = []
+        for engine in self.shard_engines:
+            with engine.connect() as connection:
+                max_ids.append(
+                    connection.execute(
+                        select(func.max(fingerprints.c.id)).where(
+                            fingerprints.c.song_id == song_id
+                        )
+                    ).scalar()
+                )
+        return max_ids
+
+    def _delete_song_fingerprints(self, song_id, batch_size, max_ids=None):
+        """Deletes the fingerprints of song_id from every shard in batches.
+
+        Each batch is a set-based DELETE of at most batch_size rows, found
+        through the song_id index and committed on its own, so row locks are
+        held briefly and concurrent lookups are never blocked for long.
+
+        Args:
+            song_id (int): The song whose fingerprints to delete.
+            batch_size (int): Rows deleted per transaction.
+            max_ids (list, optional): Per-shard row IDs as returned by
+                _max_fingerprint_ids; only rows up to them are deleted.
+
+        Returns:
+            int: The number of fingerprints deleted.
+        """
+        fingerprints = Fingerprint.__table__
+        deleted = 0
+        for shard_index, engine in enumerate(self.shard_engines):
+            condition = fingerprints.c.song_id == song_id
+            if max_ids is not None:
+                if max_ids[shard_index] is None:
+                    continue
+                condition = and_(condition, fingerprints.c.id <= max_ids[shard_index])
+            batch_ids = select(fingerprints.c.id).where(condition).limit(batch_size)
+            statement = delete(fingerprints).where(fingerprints.c.id.in_(batch_ids))
+            while True:
+                with engine.begin() as connection:
+                    count = connection.execute(statement).rowcount
+                deleted += count
+                if count < batch_size:
+                    break
             logger.debug(
-                "database.database_manager.DatabaseManager :: Fingerprints stored successfully"
+                "database.database_manager.DatabaseManager :: Deleted fingerprints of song %s from shard %s",
+                song_id,
+                shard_index,
             )
+        return deleted
+
+    def delete_song(self, song_id, batch_size=None):
+        """Deletes a song and all of its fingerprints.
+
+        Fingerprints go first, in batches, and the song row last, so
+        recognitions running meanwhile never match a song that is gone. The
+        hash filter keeps the song's hashes until it is rebuilt.
+
+        Args:
+            song_id (int): The ID of the song to delete.
+            batch_size (int, optional): Fingerprint rows deleted per
+                transaction. Defaults to config.MAINTENANCE_BATCH_SIZE.
+
+        Returns:
+            int: The number of fingerprints deleted, or None on error.
+        """
+        logger.info(
+            "database.database_manager.DatabaseManager :: Deleting song %s", song_id
+        )
+        batch_size = batch_size or config.MAINTENANCE_BATCH_SIZE
+        songs = Song.__table__
+        try:
+            deleted = self._delete_song_fingerprints(song_id, batch_size)
+            with self.engine.begin() as connection:
+                song_rows = connection.execute(
+                    delete(songs).where(songs.c.id == song_id)
+                ).rowcount
+            if not song_rows:
+                logger.warning(
+                    "database.database_manager.DatabaseManager :: Song %s not found; deleted %s orphaned fingerprints",
+                    song_id,
+                    deleted,
+                )
+            return deleted
         except Exception as e:
-            session.rollback()
             logger.error(
-                f"database.database_manager.DatabaseManager :: Error storing fingerprints: {e}"
+                f"database.database_manager.DatabaseManager :: Error deleting song {song_id}: {e}"
             )
+            return None
         finally:
-            session.close()
+            # Cached posting lists and song rows in every process are now stale
+            self._bump_catalog_generation()
+
+    def replace_fingerprints(self, song_id, fingerprints, batch_size=None):
+        """Replaces the stored fingerprints of a song, e.g. after re-fingerprinting.
+
+        The new fingerprints are stored before the old rows are deleted in
+        batches, so the song stays recognizable throughout. Old rows are told
+        apart by their IDs, which are all lower than those of the new rows.
+
+        Args:
+            song_id (int): The song whose fingerprints to replace.
+            fingerprints (list): The new fingerprint dictionaries for song_id.
+            batch_size (int, optional): Old rows deleted per transaction.
+                Defaults to config.MAINTENANCE_BATCH_SIZE.
+
+        Returns:
+            int: The number of old fingerprints deleted, or None on error or if
+                fingerprints is empty, in which case the old fingerprints are
+                kept.
+        """
+        logger.info(
+            "database.database_manager.DatabaseManager :: Replacing fingerprints of song %s",
+            song_id,
+        )
+        if not fingerprints:
+            # Replacing with nothing would leave the song unrecognizable
+            logger.error(
+                "database.database_manager.DatabaseManager :: No new fingerprints for song %s; keeping the old ones",
+                song_id,
+            )
+            return None
+        batch_size = batch_size or config.MAINTENANCE_BATCH_SIZE
+        try:
+            max_ids = self._max_fingerprint_ids(song_id)
+            stored = self.store_fingerprints(fingerprints)
+            if stored != len(fingerprints):
+                logger.error(
+                    "database.database_manager.DatabaseManager :: Stored only %s of %s new fingerprints for song %s; keeping the old ones",
+                    stored,
+                    len(fingerprints),
+                    song_id,
+                )
+                return None
+            return self._delete_song_fingerprints(song_id, batch_size, max_ids)
+        except Exception as e:
+            logger.error(
+                f"database.database_manager.DatabaseManager :: Error replacing fingerprints of song {song_id}: {e}"
+            )
+            return None
+        finally:
+            # Cached posting lists in every process may still hold the old rows
+            self._bump_catalog_generation()
+
+    def clear_all(self):
+        """Deletes every song and fingerprint.
+
+        PostgreSQL tables are truncated, which takes a moment regardless of
+        size and leaves no dead rows behind, and their IDs restart at 1. SQLite
+        has no TRUNCATE, but an unfiltered DELETE gets the same fast path. An
+        existing hash filter is rebuilt empty.
+
+        Returns:
+            bool: True if everything was cleared.
+        """
+        logger.info(
+            "database.database_manager.DatabaseManager :: Clearing all songs and fingerprints"
+        )
+        sharded = self.shard_engines[0] is not self.engine
+        targets = [(self.engine, ["songs"] if sharded else ["fingerprints", "songs"])]
+        if sharded:
+            targets += [
+                (shard_engine, ["fingerprints"]) for shard_engine in self.shard_engines
+            ]
+        try:
+            for engine, tables in targets:
+                with engine.begin() as connection:
+                    if engine.dialect.name == "postgresql":
+                        connection.execute(
+                            text(f"TRUNCATE TABLE {', '.join(tables)} RESTART IDENTITY")
+                        )
+                    else:
+                        for table in tables:
+                            connection.execute(text(f"DELETE FROM {table}"))
+                logger.info(
+                    "database.database_manager.DatabaseManager :: Cleared %s on %s",
+                    ", ".join(tables),
+                    engine.url,
+                )
+            hash_filter = self._current_hash_filter()
+            if hash_filter is not None:
+                # Keep the capacity, since the catalog will likely be refilled
+                self.build_hash_filter(capacity=hash_filter.capacity)
+            return True
+        except Exception as e:
+            logger.error(
+                f"database.database_manager.DatabaseManager :: Error clearing database: {e}"
+            )
+            return False
+        finally:
+            # Song IDs restart at 1, so cached songs in every process are wrong now
+            self._bump_catalog_generation()
 
     def get_song_by_id(self, song_id):
         """Retrieves a song from the database by its ID.
 
+        The song cache is checked against the catalog generation by the hash
+        lookup that precedes every song lookup during recognition.
+
         Args:
             song_id (int): The ID of the song to retrieve.
 
@@ -94,18 +810,27 @@ class DatabaseManager:
             Song: The Song object if found, None otherwise.
         """
         logger.debug(
-            f"database.database_manager.DatabaseManager :: Retrieving song with ID: {song_id}"
+            "database.database_manager.DatabaseManager :: Retrieving song with ID: %s",
+            song_id,
         )
+        song = self.song_cache.get(song_id)
+        if song is not None:
+            record_cache_lookups("songs", hits=1, misses=0)
+            return song
+        record_cache_lookups("songs", hits=0, misses=1)
+        generation = self._cache_generation
         session = self.Session()
         try:
             song = session.query(Song).filter(Song.id == song_id).first()
             if song:
                 logger.debug(
-                    f"database.database_manager.DatabaseManager :: Song found: {song}"
+                    "database.database_manager.DatabaseManager :: Song found: %s", song
                 )
+                self._cache_results(self.song_cache, [(song_id, song)], generation)
             else:
                 logger.debug(
-                    f"database.database_manager.DatabaseManager :: Song with ID {song_id} not found"
+                    "database.database_manager.DatabaseManager :: Song with ID %s not found",
+                    song_id,
                 )
             return song
         except Exception as e:
@@ -117,30 +842,187 @@ class DatabaseManager:
             session.close()
 
     def get_fingerprints_by_hash(self, hash_values):
-        """Retrieves fingerprints from the database by their hash values.
+        """Retrieves the stored fingerprints of the given hash values.
+
+        Hashes that the hash filter rules out are dropped first. Posting lists
+        of previously queried hashes are served from the hash cache, as long as
+        the catalog has not changed since they were cached; only the remaining
+        hashes are looked up in the database. Hashes absent from the database
+        are not cached, so songs added by other processes are found at once.
 
         Args:
             hash_values (list): A list of hash values to search for.
 
         Returns:
-            list: A list of Fingerprint objects matching the hash values.
+            dict: Hash value -> list of (song_id, offset) tuples, for the hashes
+                that have stored fingerprints.
         """
         logger.debug(
-            f"database.database_manager.DatabaseManager :: Retrieving fingerprints with {len(hash_values)} hashes"
+            "database.database_manager.DatabaseManager :: Retrieving fingerprints with %s hashes",
+            len(hash_values),
         )
-        session = self.Session()
+        unique_hashes = list(dict.fromkeys(hash_values))
+        hash_filter = self._current_hash_filter()
+        if hash_filter is not None:
+            try:
+                present = hash_filter.might_contain(unique_hashes)
+                candidate_hashes = [
+                    hash_value
+                    for hash_value, is_present in zip(unique_hashes, present)
+                    if is_present
+                ]
+                self._count_hash_filter_lookups(
+                    skipped=len(unique_hashes) - len(candidate_hashes),
+                    passed=len(candidate_hashes),
+                )
+                unique_hashes = candidate_hashes
+            except Exception as e:
+                logger.error(
+                    f"database.database_manager.DatabaseManager :: Error checking hash filter: {e}"
+                )
+                hash_filter = None
+        if not unique_hashes:
+            return {}
+
+        generation = self._sync_caches()
+        postings = {}
+        uncached_hashes = []
+        for hash_value in unique_hashes:
+            cached = self.hash_cache.get(hash_value)
+            if cached is None:
+                uncached_hashes.append(hash_value)
+            else:
+                postings[hash_value] = cached
+        record_cache_lookups("hashes", hits=len(postings), misses=len(uncached_hashes))
+
+        if not uncached_hashes:
+            logger.debug(
+                "database.database_manager.DatabaseManager :: Found postings for %s hashes (all cached)",
+                len(postings),
+            )
+            return postings
+
+        shard_hashes = defaultdict(list)
+        for hash_value in uncached_hashes:
+            shard_hashes[shard_for_hash(hash_value, len(self.shard_sessions))].append(
+                hash_value
+            )
+
         try:
-            # Construct the query using SQLAlchemy's text function
-            query = session.query(Fingerprint).filter(Fingerprint.hash.in_(hash_values))
-            fingerprints = query.all()
+            if self._shard_executor is not None and len(shard_hashes) > 1:
+                # Fan out to the shards concurrently and merge the results
+                futures = [
+                    self._shard_executor.submit(self._query_shard, shard_index, hashes)
+                    for shard_index, hashes in shard_hashes.items()
+                ]
+                shard_results = [future.result() for future in futures]
+            else:
+                shard_results = [
+                    self._query_shard(shard_index, hashes)
+                    for shard_index, hashes in shard_hashes.items()
+                ]
+
+            fetched = defaultdict(list)
+            for rows in shard_results:
+                for hash_value, song_id, offset in rows:
+                    fetched[hash_value].append((song_id, offset))
+            self._cache_results(self.hash_cache, fetched.items(), generation)
+            postings.update(fetched)
+            if hash_filter is not None:
+                # These passed the filter but are not in the catalog
+                self._count_hash_filter_lookups(
+                    false_positives=len(uncached_hashes) - len(fetched)
+                )
             logger.debug(
-                f"database.database_manager.DatabaseManager :: Found {len(fingerprints)} fingerprints"
+                "database.database_manager.DatabaseManager :: Found postings for %s hashes",
+                len(postings),
             )
-            return fingerprints
+            return postings
         except Exception as e:
             logger.error(
                 f"database.database_manager.DatabaseManager :: Error retrieving fingerprints: {e}"
             )
-            return []
+            return {}
+
+    def _query_shard(self, shard_index, hash_values):
+        """Fetches the fingerprints for hash_values from a single shard.
+
+        Args:
+            shard_index (int): The shard to query.
+            hash_values (list): Hashes that all route to this shard.
+
+        Returns:
+            list: (hash, song_id, offset) rows.
+        """
+        fingerprints = Fingerprint.__table__
+        session = self.shard_sessions[shard_index]()
+        try:
+            rows = []
+            # Keep IN lists below SQLite's bound-parameter limit
+            for start in range(0, len(hash_values), config.HASH_LOOKUP_BATCH_SIZE):
+                rows.extend(
+                    session.execute(
+                        select(
+                            fingerprints.c.hash,
+                            fingerprints.c.song_id,
+                            fingerprints.c.offset,
+                        ).where(
+                            fingerprints.c.hash.in_(
+                                hash_values[
+                                    start : start + config.HASH_LOOKUP_BATCH_SIZE
+                                ]
+                            )
+                        )
+                    ).all()
+                )
+            return rows
         finally:
             session.close()
+
+    def _count_hash_filter_lookups(self, skipped=0, passed=0, false_positives=0):
+        """Records hash filter results in the metrics and this manager's stats."""
+        record_hash_filter_lookups(skipped, passed, false_positives)
+        with self._hash_filter_lock:
+            self._hash_filter_counts["skipped"] += skipped
+            self._hash_filter_counts["passed"] += passed
+            self._hash_filter_counts["false_positives"] += false_positives
+
+    def hash_filter_stats(self):
+        """Returns the hash filter's occupancy and lookup counters.
+
+        The observed false-positive rate is the share of hashes absent from
+        the catalog that the filter failed to rule out.
+
+        Returns:
+            dict: The filter stats plus skipped, passed and false-positive
+                counts, or None if filtering is disabled.
+        """
+        hash_filter = self._current_hash_filter()
+        if hash_filter is None:
+            return None
+        with self._hash_filter_lock:
+            counts = dict(self._hash_filter_counts)
+        stats = hash_filter.stats()
+        stats.update(
+            {
+                "skipped": counts.get("skipped", 0),
+                "passed": counts.get("passed", 0),
+                "false_positives": counts.get("false_positives", 0),
+            }
+        )
+        absent = stats["skipped"] + stats["false_positives"]
+        stats["observed_false_positive_rate"] = (
+            stats["false_positives"] / absent if absent else 0.0
+        )
+        return stats
+
+    def cache_stats(self):
+        """Returns hit/miss counters for the song and hash caches.
+
+        Returns:
+            dict: Stats for the "songs" and "hashes" caches.
+        """
+        return {
+            "songs": self.song_cache.stats(),
+            "hashes": self.hash_cache.stats(),
+        }
@@ -19,9 +19,25 @@ class Fingerprint(Base):
     __tablename__ = "fingerprints"
 
     id = Column(Integer, Identity(), primary_key=True)
-    hash = Column(String)
-    song_id = Column(Integer)
+    hash = Column(String, index=True)
+    song_id = Column(Integer, index=True)
     offset = Column(Integer)
 
     def __repr__(self):
         return f"<Fingerprint(hash='{self.hash}', song_id={self.song_id}, offset={self.offset})>"
+
+
+class CatalogState(Base):
+    """A single row whose generation is bumped whenever the catalog changes.
+
+    Processes compare it with the generation their caches were filled at, so
+    songs added or deleted by another process invalidate those caches.
+    """
+
+    __tablename__ = "catalog_state"
+
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CatalogState(generation={self.generation})>"
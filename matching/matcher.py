@@ -2,66 +2,73 @@ from collections import defaultdict
 from config import config
 from utils.logger import logger
 from database.database_manager import DatabaseManager
-import time
+from utils import metrics
 
 
-def match_fingerprints(query_fingerprints):
+def match_fingerprints(query_fingerprints, db_manager=None):
     """Matches query fingerprints against the database in batches.
 
     Args:
         query_fingerprints (list): A list of fingerprint dictionaries.
+        db_manager (DatabaseManager, optional): The manager to query. Pass a
+            long-lived instance so its caches are reused across queries.
 
     Returns:
         dict: A dictionary mapping song IDs to match counts.
     """
     logger.debug(
-        f"matching.matcher.match_fingerprints :: Matching {len(query_fingerprints)} query fingerprints"
+        "matching.matcher.match_fingerprints :: Matching %s query fingerprints",
+        len(query_fingerprints),
     )
-    db_manager = DatabaseManager()
+    if db_manager is None:
+        db_manager = DatabaseManager()
     matches = defaultdict(int)
     try:
         # Extract all hashes from the query fingerprints
         fingerprint_hashes = [fp["hash"] for fp in query_fingerprints]
 
-        # Retrieve all matching database fingerprints at once
-        start_time = time.time()
-        database_fingerprints = db_manager.get_fingerprints_by_hash(fingerprint_hashes)
-        end_time = time.time()
+        # Retrieve all matching database fingerprints at once, grouped by hash
+        with metrics.track_stage("db_lookup"):
+            hash_to_fingerprints = db_manager.get_fingerprints_by_hash(
+                fingerprint_hashes
+            )
+        num_rows = sum(len(postings) for postings in hash_to_fingerprints.values())
+        metrics.QUERY_FINGERPRINTS.observe(len(query_fingerprints))
+        metrics.QUERY_ROWS.observe(num_rows)
         logger.debug(
-            f"Retrieved {len(database_fingerprints)} fingerprints in {end_time - start_time:.4f} seconds"
+            "matching.matcher.match_fingerprints :: Retrieved %s fingerprints",
+            num_rows,
         )
 
-        # Create a dictionary to map fingerprint hashes to a list of database fingerprints
-        hash_to_fingerprints = defaultdict(list)
-        for db_fingerprint in database_fingerprints:
-            hash_to_fingerprints[db_fingerprint.hash].append(db_fingerprint)
-
-        # Iterate through the query fingerprints and match them with the retrieved database fingerprints
-        for fingerprint_data in query_fingerprints:
-            fingerprint_hash = fingerprint_data["hash"]
-            matching_fingerprints = hash_to_fingerprints[
-                fingerprint_hash
-            ]  # Use pre-fetched fingerprints
-
-            if matching_fingerprints:
-                logger.debug(
-                    f"matching.matcher.match_fingerprints :: Found {len(matching_fingerprints)} matching fingerprints for hash {fingerprint_hash}"
-                )
-                for db_fingerprint in matching_fingerprints:
-                    # Calculate the offset difference
-                    offset_difference = (
-                        db_fingerprint.offset - fingerprint_data["offset"]
+        with metrics.track_stage("scoring"):
+            # Iterate through the query fingerprints and match them with the retrieved database fingerprints
+            for fingerprint_data in query_fingerprints:
+                fingerprint_hash = fingerprint_data["hash"]
+                matching_fingerprints = hash_to_fingerprints.get(
+                    fingerprint_hash
+                )  # Use pre-fetched (song_id, offset) postings
+
+                if matching_fingerprints:
+                    logger.debug_sampled(
+                        "matching.matcher.match_fingerprints :: Found %s matching fingerprints for hash %s",
+                        len(matching_fingerprints),
+                        fingerprint_hash,
+                    )
+                    for song_id, offset in matching_fingerprints:
+                        # Calculate the offset difference
+                        offset_difference = offset - fingerprint_data["offset"]
+                        # Combine song ID and offset difference to identify a match
+                        match_key = (song_id, offset_difference)
+                        matches[match_key] += 1
+                else:
+                    logger.debug_sampled(
+                        "matching.matcher.match_fingerprints :: No matching fingerprints found for hash %s",
+                        fingerprint_hash,
                     )
-                    # Combine song ID and offset difference to identify a match
-                    match_key = (db_fingerprint.song_id, offset_difference)
-                    matches[match_key] += 1
-            else:
-                logger.debug(
-                    f"matching.matcher.match_fingerprints :: No matching fingerprints found for hash {fingerprint_hash}"
-                )
 
         logger.debug(
-            f"matching.matcher.match_fingerprints :: Found matches for song IDs: {matches.keys()}"
+            "matching.matcher.match_fingerprints :: Found matches for %s (song ID, offset) pairs",
+            len(matches),
         )
         return matches
     except Exception as e:
@@ -94,12 +101,17 @@ def get_best_match(matches):
         # Filter matches based on a minimum number of matching fingerprints
         if matches[best_match_key] < config.MIN_HASHES:
             logger.info(
-                f"matching.matcher.get_best_match :: Best match count ({matches[best_match_key]}) is less than the minimum required ({config.MIN_HASHES})"
+                "matching.matcher.get_best_match :: Best match count (%s) is less than the minimum required (%s)",
+                matches[best_match_key],
+                config.MIN_HASHES,
             )
             return None, None
 
         logger.info(
-            f"matching.matcher.get_best_match :: Best match found: Song ID={song_id}, Offset Difference={offset_difference}, Count={matches[best_match_key]}"
+            "matching.matcher.get_best_match :: Best match found: Song ID=%s, Offset Difference=%s, Count=%s",
+            song_id,
+            offset_difference,
+            matches[best_match_key],
         )
         return song_id, offset_difference
     except Exception as e:
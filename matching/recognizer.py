@@ -0,0 +1,112 @@
+import io
+import random
+
+import numpy as np
+
+from audio.pipeline import default_pipeline
+from config import config
+from matching import matcher
+from utils import metrics
+from utils.logger import logger
+
+
+class RecognitionError(Exception):
+    """Raised when a query clip cannot be turned into fingerprints."""
+
+
+class InvalidAudioError(RecognitionError):
+    """Raised when a query clip cannot be decoded."""
+
+
+class SongNotFoundError(LookupError):
+    """Raised when the best match refers to a song that no longer exists."""
+
+
+def warm_up():
+    """Runs the load, spectrogram, peak and fingerprint stages on a synthetic clip.
+
+    The first pass pays for librosa's and scipy's lazy imports; running it at
+    startup keeps that cost off the first request. The work buffers it sizes
+    belong to the calling thread's pipeline, so other threads still allocate
+    their own on first use, which is cheap by comparison.
+
+    Returns:
+        int: The number of fingerprints created from the clip.
+    """
+    import soundfile as sf
+
+    # A two-tone clip at a different rate than config.SAMPLE_RATE, so resampling runs too
+    sample_rate = 22050
+    t = np.arange(2 * sample_rate) / sample_rate
+    clip = 0.5 * np.sin(2 * np.pi * 440 * t) + 0.3 * np.sin(2 * np.pi * 1320 * t)
+    buffer = io.BytesIO()
+    sf.write(buffer, clip.astype(np.float32), sample_rate, format="WAV")
+    buffer.seek(0)
+
+    pipeline = default_pipeline()
+    audio = pipeline.load(buffer)
+    if audio is None:
+        raise RecognitionError("Warm-up clip could not be decoded")
+    fingerprints = pipeline.fingerprint_audio(audio, song_id=0)
+    if fingerprints is None:
+        raise RecognitionError("Warm-up spectrogram could not be created")
+    return len(fingerprints)
+
+
+def recognize(audio_source, db_manager):
+    """Identifies the song in an audio clip.
+
+    Runs the full recognition pipeline: load, spectrogram, peaks, fingerprints,
+    hash lookup, scoring and metadata fetch.
+
+    Args:
+        audio_source (str or file-like): Path to, or file object holding, the clip.
+        db_manager (DatabaseManager): The manager to match against.
+
+    Returns:
+        Song: The matched Song, or None if no song matched.
+
+    Raises:
+        InvalidAudioError: If the clip cannot be decoded.
+        RecognitionError: If the spectrogram cannot be created.
+        SongNotFoundError: If the matched song ID is not in the database.
+    """
+    pipeline = default_pipeline()
+
+    # Load audio
+    audio = pipeline.load(audio_source)
+    if audio is None:
+        raise InvalidAudioError("Invalid audio file")
+
+    # Create spectrogram, extract peaks and fingerprint them
+    fingerprints = pipeline.fingerprint_audio(
+        audio, song_id=0
+    )  # Use a dummy song_id for recognition
+    if fingerprints is None:
+        raise RecognitionError("Failed to create spectrogram")
+
+    # Limit the number of fingerprints to use for matching
+    if len(fingerprints) > config.NUM_FINGERPRINTS_TO_USE:
+        fingerprints = random.sample(fingerprints, config.NUM_FINGERPRINTS_TO_USE)
+        logger.debug(
+            "matching.recognizer.recognize :: Limited fingerprints to %s",
+            config.NUM_FINGERPRINTS_TO_USE,
+        )
+
+    # Match fingerprints
+    matches = matcher.match_fingerprints(fingerprints, db_manager)
+    best_song_id, offset = matcher.get_best_match(matches)
+
+    if best_song_id is None:
+        return None
+
+    with metrics.track_stage("metadata"):
+        song = db_manager.get_song_by_id(best_song_id)
+
+    if song is None:
+        logger.error(
+            f"matching.recognizer.recognize :: Song ID not found: {best_song_id}"
+        )
+        raise SongNotFoundError(f"Song ID not found: {best_song_id}")
+
+    return song
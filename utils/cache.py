@@ -0,0 +1,124 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache:
+    """A thread-safe, size-bounded cache with least-recently-used eviction.
+
+    Entries can expire after a time to live, and the size bound can count a
+    weight per value (e.g. rows in a list) instead of entries. Keeps
+    hit/miss/eviction counters so callers can report cache efficiency.
+    """
+
+    def __init__(self, max_size, ttl=None, weigh=None):
+        """Creates an empty cache.
+
+        Args:
+            max_size (int): Max total weight of the cached values; with no
+                weigh function, the max number of entries.
+            ttl (float, optional): Seconds an entry stays valid. None keeps
+                entries until they are evicted.
+            weigh (callable, optional): Returns the weight of a value, e.g. len.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._weigh = weigh
+        self._data = OrderedDict()  # key -> (value, weight, expiry time)
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, or default if it is not cached.
+
+        Args:
+            key: The cache key.
+            default: The value to return on a miss.
+
+        Returns:
+            The cached value, or default.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, weight, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self._weight -= weight
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Stores a value, evicting the least recently used entries when full.
+
+        Values heavier than max_size on their own are not cached.
+
+        Args:
+            key: The cache key.
+            value: The value to store.
+        """
+        weight = max(1, self._weigh(value)) if self._weigh else 1
+        if weight > self.max_size:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._weight -= previous[1]
+            self._data[key] = (value, weight, expires_at)
+            self._weight += weight
+            while self._weight > self.max_size:
+                _, (_, evicted_weight, _) = self._data.popitem(last=False)
+                self._weight -= evicted_weight
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Removes a key from the cache if it is present."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._weight -= entry[1]
+
+    def clear(self):
+        """Removes all entries from the cache. Counters are kept."""
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        """Returns a snapshot of the cache counters.
+
+        Returns:
+            dict: Size, total weight, capacity, hits, misses, evictions,
+                expirations and hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "weight": self._weight,
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
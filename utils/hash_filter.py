@@ -0,0 +1,245 @@
+import math
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers in one process are still serialized
+    fcntl = None
+
+# File layout: a fixed-size header followed by the bit array
+_MAGIC = b"SSBLOOM1"
+_HEADER_FORMAT = "<8s8sQQQI"  # magic, catalog key, bits, capacity, items, hashes
+_HEADER_SIZE = 64
+_ITEMS_OFFSET = 32  # Byte offset of the item counter within the header
+# Number of set bits in every byte value
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+# Bytes scanned at a time when counting set bits
+_COUNT_CHUNK_SIZE = 1 << 24
+
+
+class HashFilter:
+    """A Bloom filter over fingerprint hashes, persisted as a memory-mapped file.
+
+    might_contain() never reports a stored hash as absent. It reports an absent
+    hash as present with a small probability that grows as the filter fills
+    up. Bit positions are derived from the hex digits of each SHA-256
+    fingerprint hash by double hashing, so no rehashing is needed.
+
+    Processes that open the same file share its pages, so hashes added by an
+    ingest process are visible to read-only API workers without reloading.
+    Hashes cannot be removed; rebuild the filter after deleting songs.
+    """
+
+    def __init__(self, path, data, writable):
+        self.path = path
+        self.writable = writable
+        self._data = data
+        (
+            _,
+            self.catalog_key,
+            self.num_bits,
+            self.capacity,
+            _,
+            self.num_hashes,
+        ) = struct.unpack_from(_HEADER_FORMAT, data)
+        self._items = data[_ITEMS_OFFSET : _ITEMS_OFFSET + 8].view(np.uint64)
+        self._bits = data[_HEADER_SIZE:]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def optimal_size(capacity, false_positive_rate):
+        """Returns the bit count and hash count for a capacity and target rate.
+
+        Args:
+            capacity (int): Number of distinct hashes the filter should hold.
+            false_positive_rate (float): Target false-positive rate at capacity.
+
+        Returns:
+            tuple: The number of bits (a multiple of 8) and of hash functions.
+        """
+        capacity = max(int(capacity), 1)
+        num_bits = math.ceil(
+            -capacity * math.log(false_positive_rate) / math.log(2) ** 2
+        )
+        num_bits = max(8, num_bits + (-num_bits % 8))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return num_bits, num_hashes
+
+    @classmethod
+    def create(cls, path, capacity, false_positive_rate, catalog_key=b""):
+        """Creates an empty filter file, replacing any file at path.
+
+        Args:
+            path (str): Where to write the filter.
+            capacity (int): Number of distinct hashes the filter should hold.
+            false_positive_rate (float): Target false-positive rate at capacity.
+            catalog_key (bytes): Identifies the catalog the filter belongs to.
+
+        Returns:
+            HashFilter: The new filter, open for writing.
+        """
+        num_bits, num_hashes = cls.optimal_size(capacity, false_positive_rate)
+        header = struct.pack(
+            _HEADER_FORMAT,
+            _MAGIC,
+            catalog_key,
+            num_bits,
+            int(capacity),
+            0,
+            num_hashes,
+        )
+        with open(path, "wb") as f:
+            f.write(header.ljust(_HEADER_SIZE, b"\0"))
+            f.truncate(_HEADER_SIZE + num_bits // 8)  # Zero-filled bit array
+        return cls.open(path, writable=True)
+
+    @classmethod
+    def open(cls, path, writable=False):
+        """Memory-maps an existing filter file.
+
+        Args:
+            path (str): The filter file.
+            writable (bool): Map the file for add() as well as lookups.
+
+        Returns:
+            HashFilter: The mapped filter.
+
+        Raises:
+            ValueError: If the file is not a hash filter.
+        """
+        data = np.memmap(path, dtype=np.uint8, mode="r+" if writable else "r")
+        if len(data) < _HEADER_SIZE or bytes(data[: len(_MAGIC)]) != _MAGIC:
+            raise ValueError(f"{path} is not a hash filter file")
+        hash_filter = cls(path, data, writable)
+        if len(hash_filter._bits) * 8 != hash_filter.num_bits:
+            raise ValueError(f"{path} is truncated")
+        return hash_filter
+
+    def _positions(self, hash_values):
+        """Returns the (len(hash_values), num_hashes) bit positions of each hash."""
+        count = len(hash_values)
+        h1 = np.fromiter(
+            (int(hash_value[16:32], 16) for hash_value in hash_values),
+            dtype=np.uint64,
+            count=count,
+        )
+        h2 = np.fromiter(
+            (int(hash_value[32:48], 16) for hash_value in hash_values),
+            dtype=np.uint64,
+            count=count,
+        )
+        h2 |= np.uint64(1)  # An odd step visits distinct positions
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        # uint64 arithmetic wraps, which is fine for deriving positions
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def might_contain(self, hash_values):
+        """Checks which hashes may have been added.
+
+        Args:
+            hash_values (list): Hex fingerprint hashes.
+
+        Returns:
+            np.ndarray: A bool per hash; False means the hash was never added.
+        """
+        if not hash_values:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(hash_values)
+        bytes_ = self._bits[positions >> np.uint64(3)]
+        bits = (bytes_ >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=1)
+
+    @contextmanager
+    def _write_lock(self):
+        """Serializes writers across threads and, where supported, processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path, "rb") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def add(self, hash_values):
+        """Adds hashes to the filter.
+
+        Args:
+            hash_values (list): Hex fingerprint hashes.
+        """
+        if not self.writable:
+            raise ValueError("Hash filter was opened read-only")
+        if not hash_values:
+            return
+        positions = self._positions(hash_values).ravel()
+        masks = np.left_shift(1, (positions & np.uint64(7)).astype(np.uint8)).astype(
+            np.uint8
+        )
+        with self._write_lock():
+            np.bitwise_or.at(self._bits, positions >> np.uint64(3), masks)
+            self._items += np.uint64(len(hash_values))
+
+    @property
+    def num_items(self):
+        """Number of hashes added, counting repeats."""
+        return int(self._items[0])
+
+    def fill_ratio(self):
+        """Returns the fraction of bits that are set."""
+        set_bits = 0
+        for start in range(0, len(self._bits), _COUNT_CHUNK_SIZE):
+            chunk = self._bits[start : start + _COUNT_CHUNK_SIZE]
+            set_bits += int(_POPCOUNT[chunk].sum(dtype=np.uint64))
+        return set_bits / self.num_bits
+
+    def estimated_false_positive_rate(self):
+        """Estimates the current false-positive rate from the number of items.
+
+        Unlike fill_ratio() this does not scan the bits, so it is cheap enough
+        to call on every metrics scrape. Repeated hashes are counted as new
+        items, so the estimate errs high.
+        """
+        fill_ratio = 1.0 - math.exp(-self.num_hashes * self.num_items / self.num_bits)
+        return fill_ratio**self.num_hashes
+
+    def flush(self):
+        """Writes pending changes to disk."""
+        if self.writable:
+            self._data.flush()
+
+    def close(self):
+        """Flushes the filter and drops its mapping."""
+        self.flush()
+        # The file is unmapped once no views of it remain
+        self._data = self._bits = self._items = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def stats(self):
+        """Returns the filter's size and occupancy.
+
+        Returns:
+            dict: Path, bits, hash functions, capacity, items added, fill ratio
+                and the false-positive rate estimated from the counted fill ratio.
+        """
+        fill_ratio = self.fill_ratio()
+        return {
+            "path": os.path.abspath(self.path),
+            "num_bits": self.num_bits,
+            "num_hashes": self.num_hashes,
+            "capacity": self.capacity,
+            "num_items": self.num_items,
+            "fill_ratio": fill_ratio,
+            "estimated_false_positive_rate": fill_ratio**self.num_hashes,
+        }
@@ -1,25 +1,42 @@
+import atexit
+import itertools
 import logging
+import logging.handlers
+import os
+import queue
 import sys
 
-from config import DEBUG, config
+from config import config
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records without formatting them in the calling thread.
+
+    The default QueueHandler formats the message before enqueueing it; the
+    records never leave this process, so formatting is left to the listener.
+    """
+
+    def prepare(self, record):
+        return record
 
 
 class Logger:
     def __init__(self, name):
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(
-            logging.DEBUG if DEBUG else logging.INFO
-        )  # Set default level based on DEBUG
+        level = logging.getLevelName(config.LOG_LEVEL)
+        self.logger.setLevel(level)  # Set default level from LOG_LEVEL
+        self.sample_every = max(1, config.LOG_SAMPLE_EVERY)
+        self._sample_counters = {}
 
         # Create handlers
         stream_handler = logging.StreamHandler(
             sys.stdout
         )  # Use stdout for cleaner output
-        stream_handler.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+        stream_handler.setLevel(level)
 
         # Create file handler
         file_handler = logging.FileHandler(config.LOG_FILE)
-        file_handler.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+        file_handler.setLevel(level)
 
         # Create formatter and add it to handlers
         formatter = logging.Formatter(
@@ -28,24 +45,68 @@ class Logger:
         stream_handler.setFormatter(formatter)
         file_handler.setFormatter(formatter)
 
-        # Add handlers to the logger
-        self.logger.addHandler(stream_handler)
-        self.logger.addHandler(file_handler)
+        # Callers only enqueue records; a background thread formats and writes them
+        self._handlers = (stream_handler, file_handler)
+        self._queue_handler = _DeferredQueueHandler(queue.SimpleQueue())
+        self.logger.addHandler(self._queue_handler)
+        self._start_listener()
+        atexit.register(self._stop_listener)  # Flush queued records on exit
+        if hasattr(os, "register_at_fork"):
+            # Forked children (e.g. gunicorn --preload workers) do not inherit
+            # the listener thread, so give them a fresh queue and listener
+            os.register_at_fork(after_in_child=self._start_listener)
+
+    def _start_listener(self):
+        """Starts a listener thread draining a new queue into the handlers."""
+        log_queue = queue.SimpleQueue()
+        self._queue_handler.queue = log_queue
+        self.listener = logging.handlers.QueueListener(
+            log_queue, *self._handlers, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def _stop_listener(self):
+        """Writes out the queued records and stops the listener thread."""
+        self.listener.stop()
+
+    def is_enabled_for(self, level):
+        """Returns True if messages at level would be emitted.
+
+        Use this to skip building expensive log arguments.
+        """
+        return self.logger.isEnabledFor(level)
+
+    # Messages use %-style placeholders; args are only formatted if the level is enabled
+    def debug(self, message, *args):
+        self.logger.debug(message, *args)
+
+    def debug_sampled(self, message, *args):
+        """Logs a per-item debug message, keeping one in every LOG_SAMPLE_EVERY calls.
 
-    def debug(self, message):
-        self.logger.debug(message)
+        Calls are counted per message template, so different messages are
+        sampled independently.
+        """
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        counter = self._sample_counters.get(message)
+        if counter is None:
+            counter = self._sample_counters.setdefault(message, itertools.count())
+        if next(counter) % self.sample_every == 0:
+            if self.sample_every > 1:
+                message = f"{message} (sampled 1/{self.sample_every})"
+            self.logger.debug(message, *args)
 
-    def info(self, message):
-        self.logger.info(message)
+    def info(self, message, *args):
+        self.logger.info(message, *args)
 
-    def warning(self, message):
-        self.logger.warning(message)
+    def warning(self, message, *args):
+        self.logger.warning(message, *args)
 
-    def error(self, message):
-        self.logger.error(message)
+    def error(self, message, *args):
+        self.logger.error(message, *args)
 
-    def critical(self, message):
-        self.logger.critical(message)
+    def critical(self, message, *args):
+        self.logger.critical(message, *args)
 
 
 logger = Logger(__name__)
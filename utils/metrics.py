@@ -0,0 +1,197 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# Latency buckets (seconds) spanning sub-millisecond stages to multi-second decodes
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+COUNT_BUCKETS = (0, 1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+STAGE_LATENCY = Histogram(
+    "sonicsherlock_stage_duration_seconds",
+    "Time spent in each stage of the fingerprint and recognition pipeline.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+RECOGNITION_LATENCY = Histogram(
+    "sonicsherlock_recognition_duration_seconds",
+    "End-to-end time to handle a recognition request.",
+    buckets=LATENCY_BUCKETS,
+)
+QUERY_FINGERPRINTS = Histogram(
+    "sonicsherlock_query_fingerprints",
+    "Number of fingerprints matched per recognition query.",
+    buckets=COUNT_BUCKETS,
+)
+QUERY_ROWS = Histogram(
+    "sonicsherlock_query_rows",
+    "Number of fingerprint rows returned by the hash lookup per query.",
+    buckets=COUNT_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "sonicsherlock_cache_lookups_total",
+    "Cache lookups in DatabaseManager, by cache and result.",
+    ["cache", "result"],
+)
+HASH_FILTER_LOOKUPS = Counter(
+    "sonicsherlock_hash_filter_lookups_total",
+    "Query hashes checked against the hash-presence filter, by result "
+    "(skipped: ruled out without a database lookup, passed: looked up).",
+    ["result"],
+)
+HASH_FILTER_FALSE_POSITIVES = Counter(
+    "sonicsherlock_hash_filter_false_positives_total",
+    "Query hashes that passed the hash-presence filter but were not in the catalog.",
+)
+HASH_FILTER_ESTIMATED_FPR = Gauge(
+    "sonicsherlock_hash_filter_estimated_false_positive_rate",
+    "False-positive rate of the hash-presence filter estimated from the hashes added.",
+)
+
+# Per-request stage timings, populated only while a request is being timed
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+# Per-stage call counts and wall/CPU time, populated only while profiling
+_stage_profile = contextvars.ContextVar("stage_profile", default=None)
+
+
+def start_request_timing():
+    """Starts collecting stage timings for the current request context.
+
+    Returns:
+        dict: The dictionary that track_stage fills with stage -> seconds.
+    """
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def start_stage_profile():
+    """Starts collecting per-stage wall and CPU time for the current context.
+
+    Returns:
+        dict: The dictionary that track_stage fills with
+            stage -> {"calls": int, "wall": seconds, "cpu": seconds}.
+    """
+    profile = {}
+    _stage_profile.set(profile)
+    return profile
+
+
+@contextmanager
+def track_stage(stage):
+    """Times a pipeline stage and records it in the stage latency histogram.
+
+    The duration is also added to the current request's timings and, while
+    profiling, to the stage profile along with the thread's CPU time.
+
+    Args:
+        stage (str): The stage name, e.g. "stft" or "db_lookup".
+    """
+    profile = _stage_profile.get()
+    start_cpu = time.thread_time() if profile is not None else 0.0
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        STAGE_LATENCY.labels(stage=stage).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+        if profile is not None:
+            entry = profile.setdefault(stage, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+            entry["calls"] += 1
+            entry["wall"] += elapsed
+            entry["cpu"] += time.thread_time() - start_cpu
+
+
+def record_cache_lookups(cache, hits, misses):
+    """Adds cache hit and miss counts to the cache lookup counter.
+
+    Args:
+        cache (str): The cache name, "songs" or "hashes".
+        hits (int): Number of hits.
+        misses (int): Number of misses.
+    """
+    if hits:
+        CACHE_LOOKUPS.labels(cache=cache, result="hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache=cache, result="miss").inc(misses)
+
+
+def record_hash_filter_lookups(skipped, passed, false_positives=0):
+    """Adds hash-presence filter results to the filter counters.
+
+    Args:
+        skipped (int): Hashes the filter ruled out.
+        passed (int): Hashes the filter let through to the lookup.
+        false_positives (int): Passed hashes the lookup did not find.
+    """
+    if skipped:
+        HASH_FILTER_LOOKUPS.labels(result="skipped").inc(skipped)
+    if passed:
+        HASH_FILTER_LOOKUPS.labels(result="passed").inc(passed)
+    if false_positives:
+        HASH_FILTER_FALSE_POSITIVES.inc(false_positives)
+
+
+def watch_hash_filter(hash_filter):
+    """Reports hash_filter's estimated false-positive rate on every scrape.
+
+    The estimate is computed from the filter's item count rather than by
+    scanning its bits, so scrapes stay cheap however large the filter is.
+
+    Args:
+        hash_filter (HashFilter): The filter in use, or None when disabled.
+    """
+    if hash_filter is None:
+        HASH_FILTER_ESTIMATED_FPR.set_function(lambda: 0.0)
+    else:
+        HASH_FILTER_ESTIMATED_FPR.set_function(
+            hash_filter.estimated_false_positive_rate
+        )
+
+
+def format_server_timing(timings):
+    """Formats stage timings as a Server-Timing header value.
+
+    Args:
+        timings (dict): Stage name -> duration in seconds.
+
+    Returns:
+        str: e.g. "decode;dur=12.31, stft;dur=4.02" (milliseconds).
+    """
+    return ", ".join(
+        f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()
+    )
+
+
+def render_latest():
+    """Renders all metrics in the Prometheus text exposition format.
+
+    Returns:
+        tuple: The payload bytes and its content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,169 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from config import config
+from utils.logger import logger
+
+# cProfile allows one active profiler per process, so sampled requests take turns
+_request_profile_lock = threading.Lock()
+
+
+class SamplingProfiler:
+    """Samples a thread's Python stack at a fixed interval.
+
+    Stacks are counted in the "folded" format (frames joined by ";"), which
+    flamegraph.pl, speedscope and inferno render as flame graphs. enable() and
+    disable() mirror cProfile.Profile so the two can be swapped.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                module = os.path.splitext(os.path.basename(code.co_filename))[0]
+                stack.append(f"{module}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def enable(self):
+        self._thread = threading.Thread(
+            target=self._sample, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def disable(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def write_folded(self, path):
+        """Writes the collected stacks as "frame;frame;frame count" lines."""
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def format_stage_table(stage_profile):
+    """Formats per-stage wall and CPU time as a text table.
+
+    Args:
+        stage_profile (dict): As filled in by metrics.start_stage_profile.
+
+    Returns:
+        str: The table, slowest stage first.
+    """
+    lines = [
+        f"{'stage':<14}{'calls':>7}{'wall ms':>12}{'cpu ms':>12}{'wall ms/call':>15}"
+    ]
+    ordered = sorted(stage_profile.items(), key=lambda item: -item[1]["wall"])
+    for stage, entry in ordered:
+        lines.append(
+            f"{stage:<14}{entry['calls']:>7}{entry['wall'] * 1000:>12.1f}"
+            f"{entry['cpu'] * 1000:>12.1f}{entry['wall'] * 1000 / entry['calls']:>15.2f}"
+        )
+    return "\n".join(lines)
+
+
+def format_top_functions(profiler, limit=20):
+    """Returns the cProfile functions with the highest cumulative time.
+
+    Args:
+        profiler (cProfile.Profile): A stopped profiler.
+        limit (int): Number of functions to include.
+
+    Returns:
+        str: The pstats report.
+    """
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
+
+
+def format_top_allocations(snapshot, limit=10):
+    """Returns the source lines that allocated the most memory.
+
+    Args:
+        snapshot (tracemalloc.Snapshot): A tracemalloc snapshot.
+        limit (int): Number of lines to include.
+
+    Returns:
+        str: One "size  count  location" line per allocation site.
+    """
+    lines = []
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        lines.append(
+            f"{stat.size / 2**10:>10.1f} KiB {stat.count:>8} blocks  {frame.filename}:{frame.lineno}"
+        )
+    return "\n".join(lines)
+
+
+@contextmanager
+def trace_allocations():
+    """Tracks Python allocations for the duration of the block.
+
+    Yields:
+        dict: Filled on exit with "peak_bytes" and the final "snapshot".
+    """
+    result = {}
+    tracemalloc.start()
+    try:
+        yield result
+    finally:
+        _, result["peak_bytes"] = tracemalloc.get_traced_memory()
+        result["snapshot"] = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+
+@contextmanager
+def maybe_profile_request(name):
+    """Profiles a sampled fraction of requests under cProfile.
+
+    A request is profiled with probability config.PROFILE_SAMPLE_RATE and the
+    stats are written to config.PROFILE_OUTPUT_DIR as a .prof file, which
+    snakeviz or flameprof can render. Requests that arrive while another one
+    is being profiled are not profiled.
+
+    Args:
+        name (str): A short name used in the output file name.
+    """
+    if (
+        config.PROFILE_SAMPLE_RATE <= 0
+        or random.random() >= config.PROFILE_SAMPLE_RATE
+        or not _request_profile_lock.acquire(blocking=False)
+    ):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+        os.makedirs(config.PROFILE_OUTPUT_DIR, exist_ok=True)
+        path = os.path.join(config.PROFILE_OUTPUT_DIR, f"{name}-{time.time_ns()}.prof")
+        profiler.dump_stats(path)
+        logger.info("utils.profiling.maybe_profile_request :: Wrote profile %s", path)
+    finally:
+        _request_profile_lock.release()